@@ -1,6 +1,11 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from routers import videos
+from fastapi.responses import PlainTextResponse
+from routers import videos, admin
+import metrics
+import storage
+
+metrics.configure_logging()
 
 app = FastAPI(title="AI Clipping Backend", version="0.1.0")
 
@@ -21,9 +26,22 @@ app.add_middleware(
 )
 
 app.include_router(videos.router, prefix="/api", tags=["videos"])
+app.include_router(admin.router, prefix="/api", tags=["admin"])
+
+@app.on_event("startup")
+def start_storage_sweeper():
+    storage.start_sweeper()
+
+@app.on_event("shutdown")
+def stop_storage_sweeper():
+    storage.stop_sweeper()
 
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render_metrics(), media_type="text/plain; version=0.0.4")
+
 
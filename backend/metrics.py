@@ -0,0 +1,278 @@
+"""Lightweight in-process metrics rendered in the Prometheus text format.
+
+Kept dependency-free on purpose so the backend still starts with the plain
+requirements.txt; `/metrics` in main.py serves `render_metrics()`.
+"""
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("clipper.spans")
+
+# Emit one log line per timed stage when enabled (SPAN_LOGGING=1)
+SPAN_LOGGING = os.environ.get("SPAN_LOGGING", "0").lower() in ("1", "true", "yes")
+
+# Level for the clipper.* loggers (span lines, storage sweeper reports)
+LOG_LEVEL = os.environ.get("CLIPPER_LOG_LEVEL", "INFO").upper()
+
+# Seconds; encodes of 60 s mobile variants and Whisper runs can take minutes
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def configure_logging() -> None:
+    """Give the clipper.* loggers a level and a stderr handler.
+
+    uvicorn only configures its own loggers and leaves the root logger at
+    WARNING, which would drop span lines and sweeper reports.
+    """
+    clipper_logger = logging.getLogger("clipper")
+    clipper_logger.setLevel(LOG_LEVEL)
+    if not clipper_logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+        clipper_logger.addHandler(handler)
+        clipper_logger.propagate = False
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = []
+    for k, v in pairs:
+        v = v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        escaped.append(f'{k}="{v}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._lock = threading.Lock()
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, help_text)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, value in self._values.items():
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, collect: Optional[Callable[[], Dict[LabelKey, float]]] = None):
+        super().__init__(name, help_text)
+        self._values: Dict[LabelKey, float] = {}
+        self._collect = collect
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track(self, **labels):
+        """Increment for the duration of the block."""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        if self._collect is not None:
+            try:
+                for key, value in self._collect().items():
+                    self.set(value, **dict(key))
+            except Exception:
+                logger.exception("Failed to collect gauge %s", self.name)
+        with self._lock:
+            for key, value in self._values.items():
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(sorted(buckets))
+        # label key -> (per-bucket counts, sum, count)
+        self._values: Dict[LabelKey, Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            counts, total, count = self._values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{_format_labels(key, ('le', str(bound)))} {bucket_count}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+_REGISTRY: List[_Metric] = []
+
+
+def _register(metric):
+    _REGISTRY.append(metric)
+    return metric
+
+
+def render_metrics() -> str:
+    lines: List[str] = []
+    for metric in _REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                continue
+    return total
+
+
+_data_dirs: Dict[str, str] = {}
+
+# Walking DATA_DIR is O(files), so the result is reused between scrapes for
+# DISK_USAGE_TTL seconds instead of being recomputed on every /metrics request
+DISK_USAGE_TTL = float(os.environ.get("METRICS_DISK_USAGE_TTL", 300))
+_disk_usage_cache: Dict[LabelKey, float] = {}
+_disk_usage_expires = 0.0
+_disk_usage_lock = threading.Lock()
+
+
+def watch_data_dir(area: str, path: str) -> None:
+    """Report the on-disk size of `path` under the given area label."""
+    _data_dirs[area] = path
+
+
+def _collect_disk_usage() -> Dict[LabelKey, float]:
+    global _disk_usage_cache, _disk_usage_expires
+    with _disk_usage_lock:
+        if time.monotonic() >= _disk_usage_expires:
+            _disk_usage_cache = {
+                _label_key({"area": area}): float(_dir_size(path)) for area, path in _data_dirs.items()
+            }
+            _disk_usage_expires = time.monotonic() + DISK_USAGE_TTL
+        return dict(_disk_usage_cache)
+
+
+STAGE_DURATION = _register(Histogram(
+    "clipper_stage_duration_seconds",
+    "Wall-clock time spent in each pipeline stage.",
+))
+STAGE_FAILURES = _register(Counter(
+    "clipper_stage_failures_total",
+    "Pipeline stages that raised an exception.",
+))
+SUBPROCESS_FAILURES = _register(Counter(
+    "clipper_subprocess_failures_total",
+    "ffmpeg/ffprobe invocations that exited non-zero or could not be started.",
+))
+FALLBACKS = _register(Counter(
+    "clipper_fallbacks_total",
+    "Times a request fell back to mock output (captions, clips).",
+))
+JOBS_IN_PROGRESS = _register(Gauge(
+    "clipper_jobs_in_progress",
+    "Processing requests currently being handled, by endpoint.",
+))
+FFMPEG_RUNNING = _register(Gauge(
+    "clipper_ffmpeg_processes_running",
+    "ffmpeg/ffprobe child processes currently running.",
+))
+FFMPEG_RUNNING.set(0)
+FFMPEG_WAITING = _register(Gauge(
+    "clipper_ffmpeg_processes_waiting",
+    "ffmpeg/ffprobe invocations queued behind the process concurrency limit.",
+))
+FFMPEG_WAITING.set(0)
+STORAGE_RECLAIMED_BYTES = _register(Counter(
+    "clipper_storage_reclaimed_bytes_total",
+    "Bytes deleted by the storage sweeper, by artifact type and reason.",
+))
+DISK_USAGE = _register(Gauge(
+    "clipper_data_dir_bytes",
+    "Bytes used on disk under DATA_DIR, by area.",
+    collect=_collect_disk_usage,
+))
+
+
+@contextmanager
+def stage_timer(stage: str, project_id: Optional[str] = None, **labels):
+    """Time a pipeline stage into STAGE_DURATION and optionally log it as a span.
+
+    project_id is only used for the span log line, never as a metric label, so
+    the number of series stays bounded.
+    """
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except BaseException:
+        status = "error"
+        STAGE_FAILURES.inc(stage=stage, **labels)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_DURATION.observe(elapsed, stage=stage, **labels)
+        if SPAN_LOGGING:
+            extra = " ".join(f"{k}={v}" for k, v in sorted(labels.items()))
+            logger.info(
+                "span project=%s stage=%s %sstatus=%s duration_ms=%.1f",
+                project_id or "-", stage, f"{extra} " if extra else "", status, elapsed * 1000,
+            )
@@ -0,0 +1,205 @@
+"""Central runner for ffmpeg/ffprobe child processes.
+
+Every invocation goes through `run_process`, which
+- waits on a global semaphore so concurrent uploads cannot spawn unbounded encoders,
+- runs the child at lower CPU priority,
+- enforces a timeout on the running child and kills it on timeout or cancellation,
+- keeps only the last STDERR_TAIL_BYTES bytes of stderr in memory.
+
+Cancellation is cooperative: callers pass a `threading.Event` (see `register_job`)
+that is set when the client disconnects or the job is cancelled explicitly.
+"""
+import os
+import sys
+import time
+import threading
+import subprocess
+from typing import Dict, List, Optional
+
+import metrics
+
+CPU_COUNT = os.cpu_count() or 1
+
+# How many ffmpeg/ffprobe processes may run at once across all requests
+MAX_CONCURRENT_PROCESSES = int(os.environ.get("FFMPEG_MAX_PROCESSES", max(1, CPU_COUNT // 2)))
+
+# Encoder threads per process so that a full semaphore roughly matches the core count
+FFMPEG_THREADS = int(os.environ.get("FFMPEG_THREADS", max(1, CPU_COUNT // MAX_CONCURRENT_PROCESSES)))
+
+# Niceness for child processes on POSIX (0 disables)
+FFMPEG_NICENESS = int(os.environ.get("FFMPEG_NICENESS", 10))
+
+# Timeouts in seconds per kind of invocation
+PROBE_TIMEOUT = float(os.environ.get("FFPROBE_TIMEOUT", 30))
+ENCODE_TIMEOUT = float(os.environ.get("FFMPEG_ENCODE_TIMEOUT", 600))
+THUMBNAIL_TIMEOUT = float(os.environ.get("FFMPEG_THUMBNAIL_TIMEOUT", 60))
+PACKAGE_TIMEOUT = float(os.environ.get("FFMPEG_PACKAGE_TIMEOUT", 600))
+
+# Optional cap in seconds on waiting for a free process slot (0 waits indefinitely)
+QUEUE_TIMEOUT = float(os.environ.get("FFMPEG_QUEUE_TIMEOUT", 0))
+
+# Bounded in bytes rather than lines: ffmpeg's progress output is one long
+# `\r`-separated line that never hits a newline
+STDERR_TAIL_BYTES = 64 * 1024
+_READ_CHUNK = 8192
+
+# How often the waiting thread checks for cancellation
+_POLL_INTERVAL = 0.2
+
+_semaphore = threading.BoundedSemaphore(MAX_CONCURRENT_PROCESSES)
+
+
+class JobCancelled(Exception):
+    """Raised when a running job is cancelled before its process finished."""
+
+
+def thread_args() -> List[str]:
+    """ffmpeg `-threads` option sized for the global concurrency limit."""
+    return ["-threads", str(FFMPEG_THREADS)]
+
+
+def _popen_kwargs() -> dict:
+    if sys.platform == "win32":
+        return {"creationflags": subprocess.BELOW_NORMAL_PRIORITY_CLASS}
+    return {}
+
+
+def _lower_priority(pid: int) -> None:
+    # Set from the parent after spawning: preexec_fn is not safe to use while
+    # other threads (reader threads, the event loop's workers) are running
+    if sys.platform == "win32" or FFMPEG_NICENESS <= 0:
+        return
+    try:
+        os.setpriority(os.PRIO_PROCESS, pid, FFMPEG_NICENESS)
+    except OSError:
+        pass
+
+
+def _drain(stream, sink) -> None:
+    for chunk in iter(lambda: stream.read1(_READ_CHUNK), b""):
+        sink.append(chunk)
+    stream.close()
+
+
+def _drain_tail(stream, tail: bytearray) -> None:
+    for chunk in iter(lambda: stream.read1(_READ_CHUNK), b""):
+        tail += chunk
+        if len(tail) > STDERR_TAIL_BYTES:
+            del tail[:-STDERR_TAIL_BYTES]
+    stream.close()
+
+
+def _acquire(cmd: List[str], cancel: Optional[threading.Event]) -> None:
+    queue_deadline = time.monotonic() + QUEUE_TIMEOUT if QUEUE_TIMEOUT > 0 else None
+    with metrics.FFMPEG_WAITING.track():
+        while not _semaphore.acquire(timeout=_POLL_INTERVAL):
+            if cancel is not None and cancel.is_set():
+                raise JobCancelled("Job cancelled while waiting for a process slot")
+            if queue_deadline is not None and time.monotonic() > queue_deadline:
+                raise subprocess.TimeoutExpired(cmd, QUEUE_TIMEOUT)
+
+
+def run_process(
+    cmd: List[str],
+    timeout: float,
+    cancel: Optional[threading.Event] = None,
+    text: bool = False,
+    check: bool = True,
+) -> subprocess.CompletedProcess:
+    """Run `cmd` under the global limits and return its CompletedProcess.
+
+    stdout is returned in full (ffprobe output is small, ffmpeg writes to files);
+    stderr is truncated to its last STDERR_TAIL_BYTES bytes. `timeout` starts once
+    the process is started; waiting for a free slot is only bounded by QUEUE_TIMEOUT.
+    """
+    if cancel is not None and cancel.is_set():
+        raise JobCancelled("Job cancelled")
+
+    _acquire(cmd, cancel)
+
+    try:
+        with metrics.FFMPEG_RUNNING.track():
+            proc = subprocess.Popen(
+                cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE, **_popen_kwargs()
+            )
+            _lower_priority(proc.pid)
+            deadline = time.monotonic() + timeout
+            stdout_chunks: List[bytes] = []
+            stderr_tail = bytearray()
+            readers = [
+                threading.Thread(target=_drain, args=(proc.stdout, stdout_chunks), daemon=True),
+                threading.Thread(target=_drain_tail, args=(proc.stderr, stderr_tail), daemon=True),
+            ]
+            for reader in readers:
+                reader.start()
+
+            killed_for = None
+            while True:
+                try:
+                    proc.wait(timeout=_POLL_INTERVAL)
+                    break
+                except subprocess.TimeoutExpired:
+                    pass
+                if cancel is not None and cancel.is_set():
+                    killed_for = "cancel"
+                elif time.monotonic() > deadline:
+                    killed_for = "timeout"
+                if killed_for:
+                    proc.kill()
+                    proc.wait()
+                    break
+
+            for reader in readers:
+                reader.join()
+    finally:
+        _semaphore.release()
+
+    stdout = b"".join(stdout_chunks)
+    stderr = bytes(stderr_tail)
+    if text:
+        stdout = stdout.decode("utf-8", errors="replace")
+        stderr = stderr.decode("utf-8", errors="replace")
+
+    if killed_for == "cancel":
+        raise JobCancelled(f"Job cancelled, killed {os.path.basename(cmd[0])}")
+    if killed_for == "timeout":
+        raise subprocess.TimeoutExpired(cmd, timeout, output=stdout, stderr=stderr)
+    if check and proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, cmd, output=stdout, stderr=stderr)
+    return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
+
+
+# Cancellation events for in-flight jobs, keyed by project id. A project can
+# have several jobs at once (e.g. mobile clips and captions).
+_jobs: Dict[str, List[threading.Event]] = {}
+_jobs_lock = threading.Lock()
+
+
+def register_job(project_id: str) -> threading.Event:
+    event = threading.Event()
+    with _jobs_lock:
+        _jobs.setdefault(project_id, []).append(event)
+    return event
+
+
+def unregister_job(project_id: str, event: threading.Event) -> None:
+    with _jobs_lock:
+        events = _jobs.get(project_id, [])
+        if event in events:
+            events.remove(event)
+        if not events:
+            _jobs.pop(project_id, None)
+
+
+def is_active(project_id: str) -> bool:
+    with _jobs_lock:
+        return bool(_jobs.get(project_id))
+
+
+def cancel_job(project_id: str) -> bool:
+    """Signal cancellation for every running job of a project; False if none is running."""
+    with _jobs_lock:
+        events = list(_jobs.get(project_id, []))
+    for event in events:
+        event.set()
+    return bool(events)
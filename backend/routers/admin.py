@@ -0,0 +1,25 @@
+from fastapi import APIRouter
+from fastapi.concurrency import run_in_threadpool
+
+import storage
+
+router = APIRouter()
+
+
+@router.get("/storage")
+async def storage_usage():
+    """Disk usage under DATA_DIR by artifact type, with the configured budget."""
+    usage = await run_in_threadpool(storage.disk_usage)
+    return {
+        "usage": usage,
+        "total_bytes": sum(entry["bytes"] for entry in usage.values()),
+        "budget_bytes": storage.DISK_BUDGET_BYTES,
+        "retention_days": storage.RETENTION_DAYS,
+    }
+
+
+@router.post("/storage/sweep")
+async def sweep_storage():
+    """Run the retention/eviction sweep now and report what was reclaimed."""
+    report = await run_in_threadpool(storage.sweep)
+    return {**report, "status": "sweep_complete"}
@@ -1,12 +1,22 @@
 import os
+import math
 import uuid
+import asyncio
+import threading
 import subprocess
 import glob
 import json
+import shutil
 import base64
-from typing import List, Optional
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+import tempfile
+from typing import List, Optional, Tuple
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request
 from fastapi.responses import FileResponse
+from fastapi.concurrency import run_in_threadpool
+
+import metrics
+import process_runner
+import storage
 
 # Optional imports for AI features
 try:
@@ -27,13 +37,6 @@ try:
 except ImportError:
     REQUESTS_AVAILABLE = False
 
-BASE_DIR = os.path.dirname(os.path.dirname(__file__))
-DATA_DIR = os.path.join(BASE_DIR, "data")
-UPLOADS_DIR = os.path.join(DATA_DIR, "uploads")
-CLIPS_DIR = os.path.join(DATA_DIR, "clips")
-os.makedirs(UPLOADS_DIR, exist_ok=True)
-os.makedirs(CLIPS_DIR, exist_ok=True)
-
 # FFmpeg path detection - try multiple locations
 FFMPEG_EXE = None
 
@@ -81,15 +84,84 @@ def get_ffmpeg_path():
         )
     return FFMPEG_EXE
 
+
+def _run(
+    cmd: List[str],
+    tool: str,
+    stage: str,
+    timeout: float,
+    cancel: Optional[threading.Event] = None,
+    text: bool = False,
+) -> subprocess.CompletedProcess:
+    """Run ffmpeg/ffprobe through the process runner and count failures."""
+    try:
+        return process_runner.run_process(cmd, timeout=timeout, cancel=cancel, text=text)
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError):
+        metrics.SUBPROCESS_FAILURES.inc(tool=tool, stage=stage)
+        raise
+
+
+def _require_project_id(project_id: str) -> None:
+    """404 for ids that are not project UUIDs so they never reach the filesystem."""
+    if not storage.is_valid_project_id(project_id):
+        raise HTTPException(status_code=404, detail="Project not found")
+
+
+async def _run_job(request: Request, project_id: str, func, *args):
+    """Run blocking pipeline work in the threadpool.
+
+    The job's ffmpeg children are killed if the client disconnects or the job is
+    cancelled through `/jobs/{project_id}/cancel`.
+    """
+    cancel = process_runner.register_job(project_id)
+    task = asyncio.ensure_future(run_in_threadpool(func, *args, cancel=cancel))
+    try:
+        while not task.done():
+            await asyncio.wait({task}, timeout=1.0)
+            if not task.done() and await request.is_disconnected():
+                cancel.set()
+                break
+        return await task
+    finally:
+        process_runner.unregister_job(project_id, cancel)
+
 router = APIRouter()
 
+# Seconds into each clip at which AI thumbnails are taken
+AI_THUMBNAIL_TIMESTAMPS = [1, 3, 5]
+
+# Per-project clip records (source range, filter) used to re-render edited clips
+CLIP_MANIFEST = "clips.json"
+_clip_records_lock = threading.Lock()
+
+# (project_id, clip_id) pairs with a trim in progress; a second trim of the same clip gets 409
+_trims_in_progress = set()
+_trims_lock = threading.Lock()
+
+# (project_id, clip_id) pairs being packaged; a concurrent packaging job skips the clip
+_packaging_in_progress = set()
+_packaging_lock = threading.Lock()
+
+# HLS preview packaging during clip generation is opt-in (HLS_PREVIEWS=1) because it
+# adds an encode per clip before the response; POST /hls/{project_id} packages on demand
+HLS_ENABLED = os.environ.get("HLS_PREVIEWS", "0").lower() in ("1", "true", "yes")
+HLS_SEGMENT_SECONDS = 2
+# Extra rendition for slow connections; the full-quality rendition is the rendered MP4 stream-copied
+HLS_LOW_VIDEO_BITRATE = "300k"
+HLS_LOW_AUDIO_BITRATE = "64k"
+HLS_MEDIA_TYPES = {
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".m4s": "video/iso.segment",
+    ".mp4": "video/mp4",
+}
+
 
 @router.post("/upload")
-async def upload_video(file: UploadFile = File(...)):
+async def upload_video(request: Request, file: UploadFile = File(...)):
     if not file.filename:
         raise HTTPException(status_code=400, detail="Missing filename")
     project_id = str(uuid.uuid4())
-    project_dir = os.path.join(UPLOADS_DIR, project_id)
+    project_dir = storage.project_upload_dir(project_id)
     os.makedirs(project_dir, exist_ok=True)
     dest_path = os.path.join(project_dir, file.filename)
     # save file
@@ -98,7 +170,10 @@ async def upload_video(file: UploadFile = File(...)):
 
     # Generate real clips using FFmpeg
     try:
-        clips = _generate_ffmpeg_clips(project_id, dest_path)
+        with metrics.JOBS_IN_PROGRESS.track(endpoint="upload"):
+            clips = await _run_job(request, project_id, _generate_ffmpeg_clips, project_id, dest_path)
+    except process_runner.JobCancelled:
+        raise HTTPException(status_code=409, detail="Processing cancelled")
     except FileNotFoundError:
         raise HTTPException(status_code=500, detail="FFmpeg not found. Please install FFmpeg and ensure it's in PATH.")
     except Exception as e:
@@ -114,12 +189,13 @@ async def upload_video(file: UploadFile = File(...)):
 
 
 @router.post("/import")
-async def import_video(url: str = Form(...)):
+async def import_video(request: Request, url: str = Form(...)):
     project_id = str(uuid.uuid4())
-    project_dir = os.path.join(UPLOADS_DIR, project_id)
+    project_dir = storage.project_upload_dir(project_id)
     os.makedirs(project_dir, exist_ok=True)
     
     try:
+        metrics.JOBS_IN_PROGRESS.inc(endpoint="import")
         # Lazy import to avoid startup failure if package isn't installed
         try:
             import yt_dlp  # type: ignore
@@ -146,12 +222,15 @@ async def import_video(url: str = Form(...)):
         downloaded_path = os.path.join(project_dir, downloaded_files[0])
 
         # Generate clips using the downloaded video
-        clips = _generate_ffmpeg_clips(project_id, downloaded_path)
+        clips = await _run_job(request, project_id, _generate_ffmpeg_clips, project_id, downloaded_path)
 
+    except process_runner.JobCancelled:
+        raise HTTPException(status_code=409, detail="Processing cancelled")
     except HTTPException:
         raise
     except Exception as e:
         # If download fails, return mock clips as fallback
+        metrics.FALLBACKS.inc(kind="mock_clips")
         clips = [
             {
                 "id": f"{project_id}-clip-{i}",
@@ -170,46 +249,172 @@ async def import_video(url: str = Form(...)):
                 ("Customer Testimonial", "0:18", 92, "16:9", "YouTube Shorts"),
             ])
         ]
+    finally:
+        metrics.JOBS_IN_PROGRESS.dec(endpoint="import")
     
     return {"project_id": project_id, "source_url": url, "clips": clips, "status": "processing_complete"}
 
 
 @router.get("/projects/{project_id}/clips")
 async def list_clips(project_id: str) -> List[dict]:
+    _require_project_id(project_id)
     # Discover generated clip files
-    project_dir = os.path.join(CLIPS_DIR, project_id)
+    project_dir = storage.project_clips_dir(project_id)
     if not os.path.isdir(project_dir):
         return []
     results = []
-    for name in os.listdir(project_dir):
-        if name.endswith(".mp4"):
+    for entry in os.scandir(project_dir):
+        name = entry.name
+        if name.endswith(".mp4") and entry.is_file():
             clip_id = name.replace(".mp4", "")
-            results.append({"id": clip_id, "title": clip_id.split("-clip-")[-1], "download_url": f"/api/clips/{project_id}/{name}"})
+            results.append({
+                "id": clip_id,
+                "title": clip_id.split("-clip-")[-1],
+                "download_url": f"/api/clips/{project_id}/{name}",
+                "hls": _hls_url(project_id, clip_id),
+            })
     return results
 
 
 @router.get("/clips/{project_id}/{clip_file}")
 async def download_clip(project_id: str, clip_file: str):
-    path = os.path.join(CLIPS_DIR, project_id, clip_file)
+    _require_project_id(project_id)
+    path = os.path.join(storage.project_clips_dir(project_id), clip_file)
     if not os.path.isfile(path):
         raise HTTPException(status_code=404, detail="Clip not found")
+    storage.mark_used(path)
     media_type = "video/mp4" if clip_file.endswith(".mp4") else "application/octet-stream"
     return FileResponse(path, media_type=media_type, filename=clip_file)
 
 
 @router.get("/thumbnails/{project_id}/{thumbnail_file}")
-async def get_thumbnail(project_id: str, thumbnail_file: str):
-    path = os.path.join(CLIPS_DIR, project_id, thumbnail_file)
+async def get_thumbnail(project_id: str, thumbnail_file: str, request: Request):
+    _require_project_id(project_id)
+    path = os.path.join(storage.project_clips_dir(project_id), thumbnail_file)
     if not os.path.isfile(path):
-        raise HTTPException(status_code=404, detail="Thumbnail not found")
+        # Thumbnails may have been evicted by the storage sweeper; rebuild from the clip.
+        # Run as a job so the sweeper leaves the project alone and a disconnect kills ffmpeg.
+        try:
+            await _run_job(request, project_id, _regenerate_thumbnail, project_id, thumbnail_file)
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired, FileNotFoundError,
+                process_runner.JobCancelled):
+            pass
+        if not os.path.isfile(path):
+            raise HTTPException(status_code=404, detail="Thumbnail not found")
+    storage.mark_used(path)
     return FileResponse(path, media_type="image/jpeg", filename=thumbnail_file)
 
 
-def _generate_ffmpeg_clips(project_id: str, source_path: str) -> List[dict]:
+@router.get("/hls/{project_id}/{clip_id}/{hls_file:path}")
+async def get_hls_file(project_id: str, clip_id: str, hls_file: str):
+    """Serve HLS playlists, init segments and media segments for clip previews."""
+    _require_project_id(project_id)
+    base = os.path.join(storage.project_clips_dir(project_id), "hls", clip_id)
+    path = os.path.normpath(os.path.join(base, hls_file))
+    media_type = HLS_MEDIA_TYPES.get(os.path.splitext(path)[1])
+    if not path.startswith(base + os.sep) or media_type is None or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Preview not found")
+    storage.mark_used(path)
+    # Playlists change when a clip is re-rendered; segments are replaced together with them
+    headers = {"Cache-Control": "no-cache"} if path.endswith(".m3u8") else None
+    return FileResponse(path, media_type=media_type, headers=headers)
+
+
+@router.post("/hls/{project_id}")
+async def package_hls_previews(project_id: str, request: Request):
+    """Package HLS previews for every rendered clip of a project that lacks one."""
+    _require_project_id(project_id)
+    project_dir = storage.project_clips_dir(project_id)
+    if not os.path.isdir(project_dir):
+        raise HTTPException(status_code=404, detail="No clips found. Generate clips first.")
+    try:
+        previews = await _run_job(request, project_id, _package_project_hls, project_id, project_dir)
+    except process_runner.JobCancelled:
+        raise HTTPException(status_code=409, detail="Packaging cancelled")
+    except FileNotFoundError:
+        raise HTTPException(status_code=500, detail="FFmpeg not found. Please install FFmpeg and ensure it's in PATH.")
+    return {"project_id": project_id, "previews": previews, "status": "previews_packaged"}
+
+
+@router.post("/clips/{project_id}/{clip_id}/trim")
+async def trim_clip(project_id: str, clip_id: str, request: Request, start: float = Form(...), end: float = Form(...)):
+    """Move a clip's in/out points (seconds in the source video), re-encoding only what changed."""
+    _require_project_id(project_id)
+    if not (math.isfinite(start) and math.isfinite(end)) or start < 0 or end <= start:
+        raise HTTPException(status_code=400, detail="Invalid clip boundaries")
+    source_path = storage.find_source_video(project_id)
+    if not source_path:
+        raise HTTPException(status_code=404, detail="Source video not found")
+    with _trims_lock:
+        if (project_id, clip_id) in _trims_in_progress:
+            raise HTTPException(status_code=409, detail="This clip is already being updated")
+        _trims_in_progress.add((project_id, clip_id))
+    try:
+        result = await _run_job(request, project_id, _rerender_clip, project_id, clip_id, source_path, start, end)
+    except process_runner.JobCancelled:
+        raise HTTPException(status_code=409, detail="Processing cancelled")
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Clip not found")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError:
+        raise HTTPException(status_code=500, detail="FFmpeg not found. Please install FFmpeg and ensure it's in PATH.")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to update clip: {e}")
+    finally:
+        with _trims_lock:
+            _trims_in_progress.discard((project_id, clip_id))
+    return {"project_id": project_id, **result, "status": "clip_updated"}
+
+
+def _clip_variants(duration: float) -> list:
+    """(title, start, duration, aspect, vf, platform) for the standard clips of a source."""
+    # Define recipes with simple scaling and padding to achieve target aspect ratios
+    # Use scale and pad filters instead of crop to avoid dimension issues
+    return [
+        ("Hook Segment", 0, min(15, duration), "9:16", f"scale=360:640,pad=360:640:(ow-iw)/2:(oh-ih)/2:black", "TikTok/Instagram Reels"),
+        ("Product Demo", min(5, duration-10), min(23, duration-5), "1:1", f"scale=360:360,pad=360:360:(ow-iw)/2:(oh-ih)/2:black", "Instagram Post"),
+        ("Customer Testimonial", min(10, duration-15), min(18, duration-10), "16:9", f"scale=640:360,pad=640:360:(ow-iw)/2:(oh-ih)/2:black", "YouTube Shorts"),
+    ]
+
+
+def _mobile_variants(duration: float) -> list:
+    """(title, start, duration, aspect, vf) for the mobile clips of a source."""
+    # Mobile-optimized clip variants
+    return [
+        ("TikTok Vertical", 0, min(15, duration), "9:16", "scale=360:640,pad=360:640:(ow-iw)/2:(oh-ih)/2:black"),
+        ("Instagram Reels", min(5, duration-10), min(30, duration-5), "9:16", "scale=360:640,pad=360:640:(ow-iw)/2:(oh-ih)/2:black"),
+        ("YouTube Shorts", min(10, duration-15), min(60, duration-10), "9:16", "scale=360:640,pad=360:640:(ow-iw)/2:(oh-ih)/2:black"),
+        ("Instagram Story", min(15, duration-20), min(15, duration-15), "9:16", "scale=360:640,pad=360:640:(ow-iw)/2:(oh-ih)/2:black"),
+    ]
+
+
+def _load_clip_records(proj_dir: str) -> dict:
+    """Clip records of a project keyed by clip id, including their source range and filter."""
+    manifest = os.path.join(proj_dir, CLIP_MANIFEST)
+    if not os.path.isfile(manifest):
+        return {}
+    with open(manifest, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _update_clip_records(proj_dir: str, updates: dict) -> dict:
+    """Merge records into the project's manifest; concurrent jobs may write the same file."""
+    manifest = os.path.join(proj_dir, CLIP_MANIFEST)
+    with _clip_records_lock:
+        records = _load_clip_records(proj_dir)
+        records.update(updates)
+        with open(manifest + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(records, f, ensure_ascii=False, indent=2)
+        os.replace(manifest + ".tmp", manifest)
+    return records
+
+
+def _generate_ffmpeg_clips(project_id: str, source_path: str, cancel: Optional[threading.Event] = None) -> List[dict]:
     """Create multiple short clips from the beginning of the source video in different aspect ratios.
     Requires ffmpeg to be installed and available on PATH.
     """
-    proj_dir = os.path.join(CLIPS_DIR, project_id)
+    proj_dir = storage.project_clips_dir(project_id)
     os.makedirs(proj_dir, exist_ok=True)
 
     # First, check if source file exists and get video info
@@ -225,36 +430,33 @@ def _generate_ffmpeg_clips(project_id: str, source_path: str) -> List[dict]:
     try:
         # Use ffprobe to get video info (it's in the same directory as ffmpeg)
         ffprobe_path = ffmpeg_path.replace("ffmpeg.exe", "ffprobe.exe")
-        probe_result = subprocess.run([
-            ffprobe_path, "-v", "quiet", "-show_entries", "format=duration",
-            "-of", "csv=p=0", source_path
-        ], capture_output=True, text=True, check=True)
+        with metrics.stage_timer("probe", project_id):
+            probe_result = _run([
+                ffprobe_path, "-v", "quiet", "-show_entries", "format=duration",
+                "-of", "csv=p=0", source_path
+            ], "ffprobe", "probe", process_runner.PROBE_TIMEOUT, cancel, text=True)
         duration = float(probe_result.stdout.strip())
-    except (subprocess.CalledProcessError, ValueError, FileNotFoundError):
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired, ValueError, FileNotFoundError):
         # If ffprobe fails, assume 60 seconds duration
         duration = 60.0
 
     # Get video dimensions first
     try:
         ffprobe_path = ffmpeg_path.replace("ffmpeg.exe", "ffprobe.exe")
-        probe_result = subprocess.run([
-            ffprobe_path, "-v", "quiet", "-select_streams", "v:0", "-show_entries", "stream=width,height",
-            "-of", "csv=p=0", source_path
-        ], capture_output=True, text=True, check=True)
+        with metrics.stage_timer("probe", project_id):
+            probe_result = _run([
+                ffprobe_path, "-v", "quiet", "-select_streams", "v:0", "-show_entries", "stream=width,height",
+                "-of", "csv=p=0", source_path
+            ], "ffprobe", "probe", process_runner.PROBE_TIMEOUT, cancel, text=True)
         width, height = map(int, probe_result.stdout.strip().split(','))
-    except (subprocess.CalledProcessError, ValueError, FileNotFoundError):
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired, ValueError, FileNotFoundError):
         # Default to 1920x1080 if we can't detect
         width, height = 1920, 1080
 
-    # Define recipes with simple scaling and padding to achieve target aspect ratios
-    # Use scale and pad filters instead of crop to avoid dimension issues
-    variants = [
-        ("Hook Segment", 0, min(15, duration), "9:16", f"scale=360:640,pad=360:640:(ow-iw)/2:(oh-ih)/2:black", "TikTok/Instagram Reels"),
-        ("Product Demo", min(5, duration-10), min(23, duration-5), "1:1", f"scale=360:360,pad=360:360:(ow-iw)/2:(oh-ih)/2:black", "Instagram Post"),
-        ("Customer Testimonial", min(10, duration-15), min(18, duration-10), "16:9", f"scale=640:360,pad=640:360:(ow-iw)/2:(oh-ih)/2:black", "YouTube Shorts"),
-    ]
+    variants = _clip_variants(duration)
 
     clips: List[dict] = []
+    records = {}
     for idx, (title, start, duration, aspect, vf, platform) in enumerate(variants):
         out_name = f"{project_id}-clip-{idx}.mp4"
         out_path = os.path.join(proj_dir, out_name)
@@ -274,14 +476,18 @@ def _generate_ffmpeg_clips(project_id: str, source_path: str) -> List[dict]:
             "-c:v", "libx264",
             "-preset", "fast",
             "-crf", "28",
+            # Keyframe every segment so HLS packaging can stream-copy this encode
+            "-force_key_frames", f"expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})",
             "-c:a", "aac",
             "-b:a", "128k",
             "-movflags", "+faststart",
+            *process_runner.thread_args(),
             out_path,
         ]
         # Run ffmpeg, capture errors
         try:
-            result = subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+            with metrics.stage_timer("encode", project_id, variant=f"clip-{idx}"):
+                result = _run(cmd, "ffmpeg", "encode", process_runner.ENCODE_TIMEOUT, cancel, text=True)
             
             # Generate thumbnail for this clip
             thumbnail_name = f"{project_id}-clip-{idx}.jpg"
@@ -292,13 +498,17 @@ def _generate_ffmpeg_clips(project_id: str, source_path: str) -> List[dict]:
                 "-ss", "00:00:01",  # Take frame at 1 second
                 "-vframes", "1",
                 "-q:v", "2",
+                *process_runner.thread_args(),
                 thumbnail_path,
             ]
             try:
-                subprocess.run(thumbnail_cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            except subprocess.CalledProcessError:
+                with metrics.stage_timer("thumbnail", project_id):
+                    _run(thumbnail_cmd, "ffmpeg", "thumbnail", process_runner.THUMBNAIL_TIMEOUT, cancel)
+            except (subprocess.CalledProcessError, subprocess.TimeoutExpired):
                 # If thumbnail generation fails, continue without it
                 pass
+
+            hls_url = _package_hls_safe(project_id, out_path, cancel)
                 
         except FileNotFoundError:
             # ffmpeg not found at the specified path
@@ -319,40 +529,41 @@ def _generate_ffmpeg_clips(project_id: str, source_path: str) -> List[dict]:
             "format": "mp4",
             "aspect": aspect,
             "platform": platform,
-            "thumbnail": f"/api/thumbnails/{project_id}/{thumbnail_name}"
+            "thumbnail": f"/api/thumbnails/{project_id}/{thumbnail_name}",
+            "hls": hls_url,
         })
+        records[clips[-1]["id"]] = {**clips[-1], "start": start, "end": start + duration, "vf": vf}
 
+    _update_clip_records(proj_dir, records)
     return clips
 
 
 # New endpoints for enhanced functionality
 
 @router.post("/mobile-clips/{project_id}")
-async def generate_mobile_clips(project_id: str):
+async def generate_mobile_clips(project_id: str, request: Request):
     """Generate mobile-optimized clips with vertical aspect ratios."""
+    _require_project_id(project_id)
     try:
         # Find the source video
-        source_path = None
-        for root, dirs, files in os.walk(UPLOADS_DIR):
-            if project_id in root:
-                for file in files:
-                    if file.endswith(('.mp4', '.mov', '.avi', '.mkv')):
-                        source_path = os.path.join(root, file)
-                        break
-                if source_path:
-                    break
+        source_path = storage.find_source_video(project_id)
         
         if not source_path:
             raise HTTPException(status_code=404, detail="Source video not found")
         
         # Generate mobile clips with vertical aspect ratios
-        mobile_clips = _generate_mobile_clips(project_id, source_path)
+        with metrics.JOBS_IN_PROGRESS.track(endpoint="mobile_clips"):
+            mobile_clips = await _run_job(request, project_id, _generate_mobile_clips, project_id, source_path)
         
         return {
             "project_id": project_id,
             "clips": mobile_clips,
             "status": "mobile_clips_generated"
         }
+    except process_runner.JobCancelled:
+        raise HTTPException(status_code=409, detail="Processing cancelled")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate mobile clips: {str(e)}")
 
@@ -360,23 +571,17 @@ async def generate_mobile_clips(project_id: str):
 @router.post("/captions/{project_id}")
 async def generate_captions(project_id: str):
     """Generate captions using Whisper AI."""
+    _require_project_id(project_id)
     try:
         # Find the source video
-        source_path = None
-        for root, dirs, files in os.walk(UPLOADS_DIR):
-            if project_id in root:
-                for file in files:
-                    if file.endswith(('.mp4', '.mov', '.avi', '.mkv')):
-                        source_path = os.path.join(root, file)
-                        break
-                if source_path:
-                    break
+        source_path = storage.find_source_video(project_id)
         
         if not source_path:
             raise HTTPException(status_code=404, detail="Source video not found")
         
         # Generate captions using Whisper
-        captions = _generate_captions(project_id, source_path)
+        with metrics.JOBS_IN_PROGRESS.track(endpoint="captions"):
+            captions = _generate_captions(project_id, source_path)
         
         return {
             "project_id": project_id,
@@ -390,9 +595,10 @@ async def generate_captions(project_id: str):
 @router.post("/translate/{project_id}")
 async def translate_captions(project_id: str, target_language: str = Form(...)):
     """Translate captions to target language."""
+    _require_project_id(project_id)
     try:
         # Load existing captions
-        captions_file = os.path.join(CLIPS_DIR, project_id, "captions.json")
+        captions_file = os.path.join(storage.project_clips_dir(project_id), "captions.json")
         if not os.path.exists(captions_file):
             raise HTTPException(status_code=404, detail="No captions found. Generate captions first.")
         
@@ -400,10 +606,11 @@ async def translate_captions(project_id: str, target_language: str = Form(...)):
             captions_data = json.load(f)
         
         # Translate captions
-        translated_captions = _translate_captions(captions_data, target_language)
+        with metrics.stage_timer("translate", project_id):
+            translated_captions = _translate_captions(captions_data, target_language)
         
         # Save translated captions
-        translated_file = os.path.join(CLIPS_DIR, project_id, f"captions_{target_language}.json")
+        translated_file = os.path.join(storage.project_clips_dir(project_id), f"captions_{target_language}.json")
         with open(translated_file, 'w', encoding='utf-8') as f:
             json.dump(translated_captions, f, ensure_ascii=False, indent=2)
         
@@ -418,54 +625,64 @@ async def translate_captions(project_id: str, target_language: str = Form(...)):
 
 
 @router.post("/ai-thumbnails/{project_id}")
-async def generate_ai_thumbnails(project_id: str):
+async def generate_ai_thumbnails(project_id: str, request: Request):
     """Generate AI-powered thumbnails for clips."""
+    _require_project_id(project_id)
     try:
         # Find existing clips
-        project_dir = os.path.join(CLIPS_DIR, project_id)
+        project_dir = storage.project_clips_dir(project_id)
         if not os.path.exists(project_dir):
             raise HTTPException(status_code=404, detail="No clips found. Generate clips first.")
         
         # Generate AI thumbnails
-        thumbnails = _generate_ai_thumbnails(project_id, project_dir)
+        with metrics.JOBS_IN_PROGRESS.track(endpoint="ai_thumbnails"):
+            thumbnails = await _run_job(request, project_id, _generate_ai_thumbnails, project_id, project_dir)
         
         return {
             "project_id": project_id,
             "thumbnails": thumbnails,
             "status": "ai_thumbnails_generated"
         }
+    except process_runner.JobCancelled:
+        raise HTTPException(status_code=409, detail="Processing cancelled")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate AI thumbnails: {str(e)}")
 
 
+@router.post("/jobs/{project_id}/cancel")
+async def cancel_job(project_id: str):
+    """Cancel running processing for a project and kill its ffmpeg processes."""
+    if not process_runner.cancel_job(project_id):
+        raise HTTPException(status_code=404, detail="No running job for this project")
+    return {"project_id": project_id, "status": "cancelling"}
+
+
 # Helper functions for new functionality
 
-def _generate_mobile_clips(project_id: str, source_path: str) -> List[dict]:
+def _generate_mobile_clips(project_id: str, source_path: str, cancel: Optional[threading.Event] = None) -> List[dict]:
     """Generate mobile-optimized clips with vertical aspect ratios."""
-    proj_dir = os.path.join(CLIPS_DIR, project_id)
+    proj_dir = storage.project_clips_dir(project_id)
     os.makedirs(proj_dir, exist_ok=True)
     
     # Get video duration
     ffmpeg_path = get_ffmpeg_path()
     try:
         ffprobe_path = ffmpeg_path.replace("ffmpeg.exe", "ffprobe.exe")
-        probe_result = subprocess.run([
-            ffprobe_path, "-v", "quiet", "-show_entries", "format=duration",
-            "-of", "csv=p=0", source_path
-        ], capture_output=True, text=True, check=True)
+        with metrics.stage_timer("probe", project_id):
+            probe_result = _run([
+                ffprobe_path, "-v", "quiet", "-show_entries", "format=duration",
+                "-of", "csv=p=0", source_path
+            ], "ffprobe", "probe", process_runner.PROBE_TIMEOUT, cancel, text=True)
         duration = float(probe_result.stdout.strip())
-    except:
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired, ValueError, FileNotFoundError):
         duration = 60.0
     
-    # Mobile-optimized clip variants
-    mobile_variants = [
-        ("TikTok Vertical", 0, min(15, duration), "9:16", "scale=360:640,pad=360:640:(ow-iw)/2:(oh-ih)/2:black"),
-        ("Instagram Reels", min(5, duration-10), min(30, duration-5), "9:16", "scale=360:640,pad=360:640:(ow-iw)/2:(oh-ih)/2:black"),
-        ("YouTube Shorts", min(10, duration-15), min(60, duration-10), "9:16", "scale=360:640,pad=360:640:(ow-iw)/2:(oh-ih)/2:black"),
-        ("Instagram Story", min(15, duration-20), min(15, duration-15), "9:16", "scale=360:640,pad=360:640:(ow-iw)/2:(oh-ih)/2:black"),
-    ]
+    mobile_variants = _mobile_variants(duration)
     
     clips = []
+    records = {}
     for idx, (title, start, clip_duration, aspect, vf) in enumerate(mobile_variants):
         if clip_duration <= 0:
             continue
@@ -482,14 +699,18 @@ def _generate_mobile_clips(project_id: str, source_path: str) -> List[dict]:
             "-c:v", "libx264",
             "-preset", "fast",
             "-crf", "28",
+            # Keyframe every segment so HLS packaging can stream-copy this encode
+            "-force_key_frames", f"expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})",
             "-c:a", "aac",
             "-b:a", "128k",
             "-movflags", "+faststart",
+            *process_runner.thread_args(),
             out_path,
         ]
         
         try:
-            subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            with metrics.stage_timer("encode", project_id, variant=f"mobile-{idx}"):
+                _run(cmd, "ffmpeg", "encode", process_runner.ENCODE_TIMEOUT, cancel)
             
             # Generate thumbnail
             thumbnail_name = f"{project_id}-mobile-{idx}.jpg"
@@ -500,14 +721,18 @@ def _generate_mobile_clips(project_id: str, source_path: str) -> List[dict]:
                 "-ss", "00:00:01",
                 "-vframes", "1",
                 "-q:v", "2",
+                *process_runner.thread_args(),
                 thumbnail_path,
             ]
             try:
-                subprocess.run(thumbnail_cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            except:
+                with metrics.stage_timer("thumbnail", project_id):
+                    _run(thumbnail_cmd, "ffmpeg", "thumbnail", process_runner.THUMBNAIL_TIMEOUT, cancel)
+            except (subprocess.CalledProcessError, subprocess.TimeoutExpired):
                 pass
+
+            hls_url = _package_hls_safe(project_id, out_path, cancel)
                 
-        except subprocess.CalledProcessError:
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired):
             continue
         
         clips.append({
@@ -517,20 +742,24 @@ def _generate_mobile_clips(project_id: str, source_path: str) -> List[dict]:
             "aspect": aspect,
             "platform": "Mobile",
             "path": out_name,
-            "thumbnail": f"/api/thumbnails/{project_id}/{thumbnail_name}"
+            "thumbnail": f"/api/thumbnails/{project_id}/{thumbnail_name}",
+            "hls": hls_url,
         })
+        records[clips[-1]["id"]] = {**clips[-1], "start": start, "end": start + clip_duration, "vf": vf}
     
+    _update_clip_records(proj_dir, records)
     return clips
 
 
 def _generate_captions(project_id: str, source_path: str) -> dict:
     """Generate captions using Whisper AI."""
-    proj_dir = os.path.join(CLIPS_DIR, project_id)
+    proj_dir = storage.project_clips_dir(project_id)
     os.makedirs(proj_dir, exist_ok=True)
     
     # Check if Whisper is available
     if not WHISPER_AVAILABLE:
         # Fallback to mock captions if Whisper is not installed
+        metrics.FALLBACKS.inc(kind="mock_captions")
         mock_captions = {
             "language": "en",
             "segments": [
@@ -547,11 +776,12 @@ def _generate_captions(project_id: str, source_path: str) -> dict:
         return mock_captions
     
     try:
-        # Load Whisper model
-        model = whisper.load_model("base")
-        
-        # Transcribe the video
-        result = model.transcribe(source_path)
+        with metrics.stage_timer("transcribe", project_id):
+            # Load Whisper model
+            model = whisper.load_model("base")
+            
+            # Transcribe the video
+            result = model.transcribe(source_path)
         
         # Format captions
         captions = {
@@ -575,6 +805,7 @@ def _generate_captions(project_id: str, source_path: str) -> dict:
         
     except Exception as e:
         # Fallback to mock captions if Whisper fails
+        metrics.FALLBACKS.inc(kind="mock_captions")
         mock_captions = {
             "language": "en",
             "segments": [
@@ -683,7 +914,413 @@ def _translate_captions(captions_data: dict, target_language: str) -> dict:
         raise Exception(f"Translation failed: {str(e)}")
 
 
-def _generate_ai_thumbnails(project_id: str, project_dir: str) -> List[dict]:
+def _hls_url(project_id: str, clip_id: str) -> Optional[str]:
+    master = os.path.join(storage.project_clips_dir(project_id), "hls", clip_id, "master.m3u8")
+    return f"/api/hls/{project_id}/{clip_id}/master.m3u8" if os.path.isfile(master) else None
+
+
+def _probe_stream_info(path: str, cancel: Optional[threading.Event] = None):
+    """Return (width, height, duration) of a rendered clip."""
+    ffprobe_path = get_ffmpeg_path().replace("ffmpeg.exe", "ffprobe.exe")
+    with metrics.stage_timer("probe"):
+        result = _run([
+            ffprobe_path, "-v", "quiet", "-select_streams", "v:0",
+            "-show_entries", "stream=width,height:format=duration",
+            "-of", "json", path
+        ], "ffprobe", "probe", process_runner.PROBE_TIMEOUT, cancel, text=True)
+    info = json.loads(result.stdout)
+    stream = info["streams"][0]
+    return int(stream["width"]), int(stream["height"]), float(info["format"]["duration"])
+
+
+def _hls_rendition_cmd(source: str, out_dir: str, codec_args: List[str]) -> List[str]:
+    return [
+        get_ffmpeg_path(), "-y",
+        "-i", source,
+        "-map", "0:v:0", "-map", "0:a:0?",
+        *codec_args,
+        "-f", "hls",
+        "-hls_time", str(HLS_SEGMENT_SECONDS),
+        "-hls_playlist_type", "vod",
+        "-hls_segment_type", "fmp4",
+        "-hls_fmp4_init_filename", "init.mp4",
+        "-hls_segment_filename", os.path.join(out_dir, "seg_%03d.m4s"),
+        os.path.join(out_dir, "index.m3u8"),
+    ]
+
+
+def _master_playlist(variants: List[tuple]) -> str:
+    """Master playlist for (playlist path, bandwidth, width, height) variants, lightest first."""
+    lines = ["#EXTM3U", "#EXT-X-VERSION:7", "#EXT-X-INDEPENDENT-SEGMENTS"]
+    for uri, bandwidth, width, height in variants:
+        lines.append(f"#EXT-X-STREAM-INF:BANDWIDTH={bandwidth},RESOLUTION={width}x{height}")
+        lines.append(uri)
+    return "\n".join(lines) + "\n"
+
+
+def _package_hls(project_id: str, clip_path: str, cancel: Optional[threading.Event] = None) -> Optional[str]:
+    """Segment a rendered clip into a two-rendition fMP4 HLS preview.
+
+    The "hi" rendition stream-copies the existing MP4; only the half-resolution
+    "lo" rendition is encoded. Clips rendered since keyframes were forced every
+    HLS_SEGMENT_SECONDS get segments of that length. Older clips keep x264's
+    default keyframe interval, so their "hi" segments can be ~10 s long.
+    Returns the master playlist URL, or the current one (possibly None) if
+    another job is already packaging this clip.
+    """
+    clip_id = os.path.basename(clip_path)[:-len(".mp4")]
+    with _packaging_lock:
+        if (project_id, clip_id) in _packaging_in_progress:
+            return _hls_url(project_id, clip_id)
+        _packaging_in_progress.add((project_id, clip_id))
+    try:
+        return _build_hls_package(project_id, clip_id, clip_path, cancel)
+    finally:
+        with _packaging_lock:
+            _packaging_in_progress.discard((project_id, clip_id))
+
+
+def _build_hls_package(project_id: str, clip_id: str, clip_path: str, cancel: Optional[threading.Event]) -> str:
+    hls_dir = os.path.join(os.path.dirname(clip_path), "hls", clip_id)
+    os.makedirs(hls_dir, exist_ok=True)
+    # Each build gets its own version directory and the master playlist is swapped
+    # in with one atomic rename, so players never see a half-written package
+    build_dir = tempfile.mkdtemp(prefix="v-", dir=hls_dir)
+    version = os.path.basename(build_dir)
+    try:
+        width, height, duration = _probe_stream_info(clip_path, cancel)
+        low_width, low_height = max(2, width // 4 * 2), max(2, height // 4 * 2)
+
+        renditions = [
+            # Listed first so players start on the light rendition and step up
+            ("lo", low_width, low_height, [
+                "-vf", f"scale={low_width}:{low_height}",
+                "-c:v", "libx264", "-preset", "fast",
+                "-b:v", HLS_LOW_VIDEO_BITRATE, "-maxrate", HLS_LOW_VIDEO_BITRATE, "-bufsize", "600k",
+                "-force_key_frames", f"expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})",
+                "-c:a", "aac", "-b:a", HLS_LOW_AUDIO_BITRATE,
+                *process_runner.thread_args(),
+            ]),
+            ("hi", width, height, ["-c", "copy"]),
+        ]
+        variants = []
+        with metrics.stage_timer("package", project_id):
+            for name, w, h, codec_args in renditions:
+                out_dir = os.path.join(build_dir, name)
+                os.makedirs(out_dir, exist_ok=True)
+                _run(_hls_rendition_cmd(clip_path, out_dir, codec_args), "ffmpeg", "package",
+                     process_runner.PACKAGE_TIMEOUT, cancel)
+                segments_bytes = sum(
+                    os.path.getsize(os.path.join(out_dir, f)) for f in os.listdir(out_dir) if f.endswith(".m4s")
+                )
+                # Peak estimate from the average bitrate
+                bandwidth = int(segments_bytes * 8 / max(duration, 0.1) * 1.2)
+                variants.append((f"{version}/{name}/index.m3u8", bandwidth, w, h))
+
+        master_tmp = os.path.join(build_dir, "master.m3u8")
+        with open(master_tmp, "w", encoding="utf-8") as f:
+            f.write(_master_playlist(variants))
+        os.replace(master_tmp, os.path.join(hls_dir, "master.m3u8"))
+    except BaseException:
+        shutil.rmtree(build_dir, ignore_errors=True)
+        raise
+
+    # Older versions are no longer referenced by the master playlist
+    for entry in os.scandir(hls_dir):
+        if entry.is_dir() and entry.name != version:
+            shutil.rmtree(entry.path, ignore_errors=True)
+    return f"/api/hls/{project_id}/{clip_id}/master.m3u8"
+
+
+def _package_hls_safe(project_id: str, clip_path: str, cancel: Optional[threading.Event] = None) -> Optional[str]:
+    """Package a preview if enabled; failures leave the clip without one (MP4 still works)."""
+    if not HLS_ENABLED:
+        return None
+    try:
+        return _package_hls(project_id, clip_path, cancel)
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired, ValueError, KeyError, IndexError, OSError):
+        return None
+
+
+def _package_project_hls(project_id: str, project_dir: str, cancel: Optional[threading.Event] = None) -> List[dict]:
+    previews = []
+    for entry in sorted(os.scandir(project_dir), key=lambda e: e.name):
+        if not entry.is_file() or not entry.name.endswith(".mp4"):
+            continue
+        clip_id = entry.name[:-len(".mp4")]
+        url = _hls_url(project_id, clip_id)
+        if url is None:
+            try:
+                url = _package_hls(project_id, entry.path, cancel)
+            except (subprocess.CalledProcessError, subprocess.TimeoutExpired, ValueError, KeyError, IndexError):
+                url = None
+        previews.append({"clip_id": clip_id, "hls": url})
+    return previews
+
+
+def _format_duration(seconds: float) -> str:
+    """Format a clip length as m:ss, e.g. 75 s -> "1:15"."""
+    minutes, secs = divmod(int(seconds), 60)
+    return f"{minutes}:{secs:02d}"
+
+
+def _source_duration(source_path: str, cancel: Optional[threading.Event] = None) -> float:
+    ffprobe_path = get_ffmpeg_path().replace("ffmpeg.exe", "ffprobe.exe")
+    result = _run([
+        ffprobe_path, "-v", "quiet", "-show_entries", "format=duration",
+        "-of", "csv=p=0", source_path
+    ], "ffprobe", "probe", process_runner.PROBE_TIMEOUT, cancel, text=True)
+    return float(result.stdout.strip())
+
+
+def _legacy_clip_record(clip_id: str, source_path: str, cancel: Optional[threading.Event] = None) -> dict:
+    """Rebuild the record of a clip rendered before clip records were kept.
+
+    Variants are a pure function of the source duration, so the original range
+    and filter can be recomputed from the clip id.
+    """
+    _, kind, index = (["", ""] + clip_id.rsplit("-", 2))[-3:]
+    if kind not in ("clip", "mobile") or not index.isdigit():
+        raise KeyError(clip_id)
+    duration = _source_duration(source_path, cancel)
+    variants = _clip_variants(duration) if kind == "clip" else _mobile_variants(duration)
+    if int(index) >= len(variants):
+        raise KeyError(clip_id)
+    title, start, clip_duration, aspect, vf = variants[int(index)][:5]
+    return {"id": clip_id, "title": title, "aspect": aspect, "path": f"{clip_id}.mp4", "start": start, "end": start + clip_duration, "vf": vf}
+
+
+def _keyframe_times(path: str, cancel: Optional[threading.Event] = None) -> List[float]:
+    """Presentation times of the video keyframes in a rendered clip."""
+    ffprobe_path = get_ffmpeg_path().replace("ffmpeg.exe", "ffprobe.exe")
+    result = _run([
+        ffprobe_path, "-v", "quiet", "-select_streams", "v:0", "-skip_frame", "nokey",
+        "-show_entries", "frame=pts_time", "-of", "csv=p=0", path
+    ], "ffprobe", "probe", process_runner.PROBE_TIMEOUT, cancel, text=True)
+    times = []
+    for line in result.stdout.splitlines():
+        try:
+            times.append(float(line.strip().rstrip(",")))
+        except ValueError:
+            continue
+    return sorted(times)
+
+
+def _encode_range_cmd(source_path: str, start: float, duration: float, vf: str, out_path: str) -> List[str]:
+    """Video-only encode of a source range with the same settings as the clip renders."""
+    return [
+        get_ffmpeg_path(), "-y",
+        "-ss", f"{start:.3f}",
+        "-i", source_path,
+        "-t", f"{duration:.3f}",
+        "-vf", vf,
+        "-an",
+        "-c:v", "libx264",
+        "-preset", "fast",
+        "-crf", "28",
+        "-force_key_frames", f"expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})",
+        *process_runner.thread_args(),
+        out_path,
+    ]
+
+
+def _copy_span(
+    old_start: float, old_end: float, keyframes: List[float], start: float, end: float
+) -> Optional[Tuple[float, float]]:
+    """Source-time span of an existing render that can be stream-copied into a new range.
+
+    `keyframes` are times within the render spanning [old_start, old_end] of the
+    source. The span runs between the first and last cut points inside the
+    overlap of the two ranges; the render's end also closes its last GOP, so it
+    is a cut point too. None if that span is shorter than HLS_SEGMENT_SECONDS.
+    """
+    cut_points = [old_start + t for t in keyframes] + [old_end]
+    overlap_start, overlap_end = max(start, old_start), min(end, old_end)
+    copy_start = next((t for t in cut_points if t >= overlap_start - 0.001), None)
+    copy_end = next((t for t in reversed(cut_points) if t <= overlap_end + 0.001), None)
+    if copy_start is None or copy_end is None or copy_end - copy_start < HLS_SEGMENT_SECONDS:
+        return None
+    return copy_start, copy_end
+
+
+def _rerender_clip(
+    project_id: str,
+    clip_id: str,
+    source_path: str,
+    start: float,
+    end: float,
+    cancel: Optional[threading.Event] = None,
+) -> dict:
+    """Re-render one clip for new source in/out points.
+
+    Whole GOPs of the existing render that still fall inside the new range are
+    stream-copied; only the head and tail up to the nearest keyframes are
+    re-encoded from the source. Audio is re-encoded for the whole range since it
+    is cheap and avoids gaps at the joins. Thumbnails are refreshed and the record
+    updated in place; the stale HLS preview is removed rather than re-packaged, so
+    the reported seconds are all the encoding done.
+    """
+    proj_dir = storage.project_clips_dir(project_id)
+    clip_path = os.path.join(proj_dir, f"{clip_id}.mp4")
+    records = _load_clip_records(proj_dir)
+    record = records.get(clip_id)
+    if record is None:
+        if not os.path.isfile(clip_path):
+            raise KeyError(clip_id)
+        record = _legacy_clip_record(clip_id, source_path, cancel)
+
+    source_duration = _source_duration(source_path, cancel)
+    end = min(end, source_duration)
+    if end - start <= 0:
+        raise ValueError("Clip boundaries are outside the source video")
+
+    old_start = record["start"]
+    span = None
+    if os.path.isfile(clip_path):
+        span = _copy_span(old_start, record["end"], _keyframe_times(clip_path, cancel), start, end)
+    copy_start, copy_end = span if span is not None else (None, None)
+
+    work_dir = tempfile.mkdtemp(prefix=".edit-", dir=proj_dir)
+    try:
+        with metrics.stage_timer("rerender", project_id):
+            parts = []
+            if copy_start is None:
+                ranges = [("full", start, end)]
+            else:
+                ranges = [("head", start, copy_start), ("tail", copy_end, end)]
+            for name, range_start, range_end in ranges:
+                if range_end - range_start < 0.01:
+                    continue
+                part = os.path.join(work_dir, f"{name}.mp4")
+                _run(_encode_range_cmd(source_path, range_start, range_end - range_start, record["vf"], part),
+                     "ffmpeg", "encode", process_runner.ENCODE_TIMEOUT, cancel)
+                parts.append((range_start, part))
+
+            if copy_start is not None:
+                middle = os.path.join(work_dir, "middle.mp4")
+                # Seek just past the keyframe so the copy starts on it, stop just before the next cut
+                _run([
+                    get_ffmpeg_path(), "-y",
+                    "-ss", f"{copy_start - old_start + 0.001:.3f}",
+                    "-i", clip_path,
+                    "-t", f"{copy_end - copy_start - 0.001:.3f}",
+                    "-map", "0:v:0", "-c", "copy",
+                    "-avoid_negative_ts", "make_zero",
+                    middle,
+                ], "ffmpeg", "copy", process_runner.ENCODE_TIMEOUT, cancel)
+                parts.append((copy_start, middle))
+
+            concat_list = os.path.join(work_dir, "parts.txt")
+            with open(concat_list, "w", encoding="utf-8") as f:
+                for _, part in sorted(parts):
+                    f.write(f"file '{os.path.basename(part)}'\n")
+
+            out_path = os.path.join(work_dir, f"{clip_id}.mp4")
+            _run([
+                get_ffmpeg_path(), "-y",
+                "-f", "concat", "-safe", "0", "-i", concat_list,
+                "-ss", f"{start:.3f}", "-t", f"{end - start:.3f}", "-i", source_path,
+                "-map", "0:v:0", "-map", "1:a:0?",
+                "-c:v", "copy",
+                "-c:a", "aac", "-b:a", "128k",
+                "-movflags", "+faststart",
+                out_path,
+            ], "ffmpeg", "concat", process_runner.ENCODE_TIMEOUT, cancel)
+            os.replace(out_path, clip_path)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    # Refresh derivatives of this clip in place. A thumbnail whose timestamp is
+    # past the new end gets no frame; the old one would show footage outside the
+    # clip, so it is removed instead.
+    thumbnails = [f"{clip_id}.jpg"] + [
+        f"{clip_id}-ai-{i}.jpg" for i in range(len(AI_THUMBNAIL_TIMESTAMPS))
+        if os.path.isfile(os.path.join(proj_dir, f"{clip_id}-ai-{i}.jpg"))
+    ]
+    for thumbnail_file in thumbnails:
+        try:
+            regenerated = _regenerate_thumbnail(project_id, thumbnail_file)
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired):
+            regenerated = False
+        if not regenerated:
+            try:
+                os.remove(os.path.join(proj_dir, thumbnail_file))
+            except OSError:
+                pass
+    # Re-packaging would re-encode the whole "lo" rendition, so drop the stale
+    # preview and leave it to POST /hls/{project_id}
+    shutil.rmtree(os.path.join(proj_dir, "hls", clip_id), ignore_errors=True)
+
+    record = {
+        **record,
+        "start": start,
+        "end": end,
+        "duration": _format_duration(end - start),
+        "thumbnail": f"/api/thumbnails/{project_id}/{clip_id}.jpg",
+        "hls": None,
+    }
+    _update_clip_records(proj_dir, {clip_id: record})
+
+    if copy_start is None:
+        copied = 0.0
+    else:
+        copied = copy_end - copy_start
+    return {
+        "clip": {k: v for k, v in record.items() if k != "vf"},
+        "reencoded_seconds": round(end - start - copied, 3),
+        "copied_seconds": round(copied, 3),
+    }
+
+
+def _regenerate_thumbnail(project_id: str, thumbnail_file: str, cancel: Optional[threading.Event] = None) -> bool:
+    """Rebuild a clip or AI thumbnail from its clip.
+
+    Returns False if the clip is gone or ffmpeg wrote no frame, e.g. when the
+    timestamp is past the end of the clip; an existing thumbnail is then kept.
+    """
+    project_dir = storage.project_clips_dir(project_id)
+    stem = os.path.basename(thumbnail_file)[:-len(".jpg")] if thumbnail_file.endswith(".jpg") else None
+    if not stem:
+        return False
+    scale = None
+    timestamp = 1
+    clip_id, sep, ai_index = stem.rpartition("-ai-")
+    if sep and ai_index.isdigit() and int(ai_index) < len(AI_THUMBNAIL_TIMESTAMPS):
+        timestamp = AI_THUMBNAIL_TIMESTAMPS[int(ai_index)]
+        scale = "scale=640:360"
+    else:
+        clip_id = stem
+    video_path = os.path.join(project_dir, f"{clip_id}.mp4")
+    if not os.path.isfile(video_path):
+        return False
+
+    # ffmpeg exits 0 without writing a frame when seeking past the end, so write to
+    # a scratch file and only replace the thumbnail if a frame came out
+    fd, scratch = tempfile.mkstemp(prefix=".thumb-", suffix=".jpg", dir=project_dir)
+    os.close(fd)
+    try:
+        cmd = [
+            get_ffmpeg_path(), "-y",
+            "-i", video_path,
+            "-ss", f"00:00:{timestamp:02d}",
+            "-vframes", "1",
+            *(["-vf", scale] if scale else []),
+            "-q:v", "2",
+            *process_runner.thread_args(),
+            scratch,
+        ]
+        with metrics.stage_timer("thumbnail", project_id):
+            _run(cmd, "ffmpeg", "thumbnail", process_runner.THUMBNAIL_TIMEOUT, cancel)
+        if os.path.getsize(scratch) == 0:
+            return False
+        os.replace(scratch, os.path.join(project_dir, os.path.basename(thumbnail_file)))
+        return True
+    finally:
+        if os.path.exists(scratch):
+            os.remove(scratch)
+
+
+def _generate_ai_thumbnails(project_id: str, project_dir: str, cancel: Optional[threading.Event] = None) -> List[dict]:
     """Generate AI-powered thumbnails for clips."""
     thumbnails = []
     
@@ -695,7 +1332,7 @@ def _generate_ai_thumbnails(project_id: str, project_dir: str) -> List[dict]:
         clip_id = video_file.replace('.mp4', '')
         
         # Generate multiple thumbnails at different timestamps
-        for i, timestamp in enumerate([1, 3, 5]):  # 1s, 3s, 5s
+        for i, timestamp in enumerate(AI_THUMBNAIL_TIMESTAMPS):
             thumbnail_name = f"{clip_id}-ai-{i}.jpg"
             thumbnail_path = os.path.join(project_dir, thumbnail_name)
             
@@ -708,9 +1345,14 @@ def _generate_ai_thumbnails(project_id: str, project_dir: str) -> List[dict]:
                     "-vframes", "1",
                     "-vf", "scale=640:360",
                     "-q:v", "2",
+                    *process_runner.thread_args(),
                     thumbnail_path,
                 ]
-                subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                with metrics.stage_timer("ai_thumbnail", project_id):
+                    _run(cmd, "ffmpeg", "ai_thumbnail", process_runner.THUMBNAIL_TIMEOUT, cancel)
+                # Clips shorter than the timestamp produce no frame
+                if not os.path.isfile(thumbnail_path):
+                    continue
                 
                 thumbnails.append({
                     "clip_id": clip_id,
@@ -719,7 +1361,7 @@ def _generate_ai_thumbnails(project_id: str, project_dir: str) -> List[dict]:
                     "type": "ai_generated"
                 })
                 
-            except subprocess.CalledProcessError:
+            except (subprocess.CalledProcessError, subprocess.TimeoutExpired):
                 continue
     
     return thumbnails
@@ -0,0 +1,328 @@
+"""On-disk layout and lifecycle management for DATA_DIR.
+
+Projects are sharded by the first two characters of their id
+(`clips/ab/abcdef12-...`) so no directory accumulates an unbounded number of
+entries. A background sweeper deletes artifacts past their retention period
+and, when DATA_DIR is over budget, evicts regenerable derivatives (thumbnails,
+previews) in least-recently-used order.
+"""
+import os
+import re
+import time
+import shutil
+import logging
+import threading
+from typing import Dict, Iterator, NamedTuple, Optional
+
+import metrics
+import process_runner
+
+logger = logging.getLogger("clipper.storage")
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+UPLOADS_DIR = os.path.join(DATA_DIR, "uploads")
+CLIPS_DIR = os.path.join(DATA_DIR, "clips")
+os.makedirs(UPLOADS_DIR, exist_ok=True)
+os.makedirs(CLIPS_DIR, exist_ok=True)
+metrics.watch_data_dir("uploads", UPLOADS_DIR)
+metrics.watch_data_dir("clips", CLIPS_DIR)
+
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.avi', '.mkv', '.webm')
+
+# Days to keep each artifact type after it was last written (0 keeps forever).
+# Originals, clips and captions are user data, so deleting them is opt-in;
+# only regenerable derivatives expire by default.
+RETENTION_DAYS = {
+    "source": float(os.environ.get("RETENTION_DAYS_SOURCE", 0)),
+    "clip": float(os.environ.get("RETENTION_DAYS_CLIP", 0)),
+    "captions": float(os.environ.get("RETENTION_DAYS_CAPTIONS", 0)),
+    "thumbnail": float(os.environ.get("RETENTION_DAYS_THUMBNAIL", 30)),
+    "preview": float(os.environ.get("RETENTION_DAYS_PREVIEW", 7)),
+    "other": float(os.environ.get("RETENTION_DAYS_OTHER", 0)),
+}
+
+# Artifacts that can be rebuilt from a clip and may be evicted under disk pressure
+REGENERABLE = {"thumbnail", "preview"}
+
+# Disk budget for DATA_DIR in bytes (0 disables eviction); eviction stops at
+# DISK_LOW_WATERMARK * budget so it does not run on every sweep
+DISK_BUDGET_BYTES = int(float(os.environ.get("DATA_DIR_BUDGET_GB", 10)) * 1024 ** 3)
+DISK_LOW_WATERMARK = 0.9
+
+SWEEP_INTERVAL = float(os.environ.get("STORAGE_SWEEP_INTERVAL", 3600))
+
+# Directories inside a project holding packaged previews
+PREVIEW_DIRS = {"hls", "previews"}
+
+_PROJECT_ID_RE = re.compile(r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$")
+
+
+class InvalidProjectId(Exception):
+    """Raised for project ids that are not UUIDs, e.g. `..` path segments."""
+
+
+def is_valid_project_id(project_id: str) -> bool:
+    return bool(_PROJECT_ID_RE.match(project_id))
+
+
+def _shard(project_id: str) -> str:
+    return project_id[:2].lower()
+
+
+def _project_dir(root: str, project_id: str) -> str:
+    # Project ids come straight from URLs; anything but a UUID could escape DATA_DIR
+    if not is_valid_project_id(project_id):
+        raise InvalidProjectId(project_id)
+    sharded = os.path.join(root, _shard(project_id), project_id)
+    legacy = os.path.join(root, project_id)
+    # Projects created before sharding live directly under root until migrated
+    if not os.path.isdir(sharded) and os.path.isdir(legacy):
+        return legacy
+    return sharded
+
+
+def project_clips_dir(project_id: str) -> str:
+    return _project_dir(CLIPS_DIR, project_id)
+
+
+def project_upload_dir(project_id: str) -> str:
+    return _project_dir(UPLOADS_DIR, project_id)
+
+
+def find_source_video(project_id: str) -> Optional[str]:
+    """Return the uploaded/imported source video for a project, if it still exists."""
+    upload_dir = project_upload_dir(project_id)
+    if not os.path.isdir(upload_dir):
+        return None
+    for entry in os.scandir(upload_dir):
+        if entry.is_file() and entry.name.lower().endswith(VIDEO_EXTENSIONS):
+            return entry.path
+    return None
+
+
+def mark_used(path: str) -> None:
+    """Record an access for LRU eviction by bumping atime, keeping mtime for retention."""
+    try:
+        st = os.stat(path)
+        os.utime(path, (time.time(), st.st_mtime))
+    except OSError:
+        pass
+
+
+def migrate_legacy_layout() -> int:
+    """Move unsharded project directories into their shard; returns how many moved."""
+    moved = 0
+    for root in (UPLOADS_DIR, CLIPS_DIR):
+        for entry in os.scandir(root):
+            if not entry.is_dir() or not is_valid_project_id(entry.name):
+                continue
+            if process_runner.is_active(entry.name):
+                continue
+            target = os.path.join(root, _shard(entry.name), entry.name)
+            if os.path.exists(target):
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.move(entry.path, target)
+            moved += 1
+    return moved
+
+
+class _Artifact(NamedTuple):
+    path: str
+    project_id: str
+    kind: str
+    size: int
+    mtime: float
+    last_used: float
+
+
+def artifact_type(area: str, rel_parts: tuple) -> str:
+    """Classify a file under DATA_DIR by the area it lives in and its name."""
+    if area == "uploads":
+        return "source"
+    if any(part in PREVIEW_DIRS for part in rel_parts[:-1]):
+        return "preview"
+    name = rel_parts[-1].lower()
+    # clips.json holds the clip records and lives as long as the clips
+    if name.endswith(".mp4") or name == "clips.json":
+        return "clip"
+    if name.endswith(".jpg"):
+        return "thumbnail"
+    if name.endswith(".json"):
+        return "captions"
+    return "other"
+
+
+def _iter_artifacts() -> Iterator[_Artifact]:
+    for area, root in (("uploads", UPLOADS_DIR), ("clips", CLIPS_DIR)):
+        for dirpath, _dirs, files in os.walk(root):
+            rel = os.path.relpath(dirpath, root)
+            parts = () if rel == "." else tuple(rel.split(os.sep))
+            # Sharded: <shard>/<project_id>/..., legacy: <project_id>/...
+            if len(parts) >= 2 and len(parts[0]) == 2:
+                project_id, inner = parts[1], parts[2:]
+            elif parts:
+                project_id, inner = parts[0], parts[1:]
+            else:
+                continue
+            for name in files:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield _Artifact(
+                    path=path,
+                    project_id=project_id,
+                    kind=artifact_type(area, inner + (name,)),
+                    size=st.st_size,
+                    mtime=st.st_mtime,
+                    last_used=max(st.st_atime, st.st_mtime),
+                )
+
+
+def disk_usage() -> Dict[str, dict]:
+    """Bytes and file counts under DATA_DIR grouped by artifact type."""
+    usage: Dict[str, dict] = {}
+    for artifact in _iter_artifacts():
+        entry = usage.setdefault(artifact.kind, {"files": 0, "bytes": 0})
+        entry["files"] += 1
+        entry["bytes"] += artifact.size
+    return usage
+
+
+# Leave freshly created directories alone so an upload that has just made its
+# project directory does not lose it before the first file is written
+_EMPTY_DIR_GRACE_SECONDS = 600
+
+
+def _remove_empty_dirs(root: str, now: float) -> None:
+    for dirpath, _dirs, _files in os.walk(root, topdown=False):
+        if dirpath == root:
+            continue
+        try:
+            if now - os.stat(dirpath).st_mtime > _EMPTY_DIR_GRACE_SECONDS:
+                os.rmdir(dirpath)
+        except OSError:
+            pass
+
+
+def _delete(artifact: _Artifact, reason: str, report: dict) -> int:
+    try:
+        os.remove(artifact.path)
+    except OSError:
+        return 0
+    entry = report[reason].setdefault(artifact.kind, {"files": 0, "bytes": 0})
+    entry["files"] += 1
+    entry["bytes"] += artifact.size
+    metrics.STORAGE_RECLAIMED_BYTES.inc(artifact.size, artifact=artifact.kind, reason=reason)
+    return artifact.size
+
+
+def _package_root(path: str) -> str:
+    """Directory of the preview package a file belongs to (e.g. `hls/<clip_id>`)."""
+    parent = os.path.dirname(path)
+    while os.path.basename(os.path.dirname(parent)) not in PREVIEW_DIRS:
+        up = os.path.dirname(parent)
+        if up == parent:
+            return os.path.dirname(path)
+        parent = up
+    return parent
+
+
+def _delete_unit(unit: list, reason: str, report: dict) -> int:
+    """Delete one eviction unit: a single file, or a whole preview package so
+    players never see a playlist with missing segments."""
+    freed = sum(_delete(artifact, reason, report) for artifact in unit)
+    if unit[0].kind == "preview":
+        shutil.rmtree(_package_root(unit[0].path), ignore_errors=True)
+    return freed
+
+
+_sweep_lock = threading.Lock()
+
+
+def sweep(now: Optional[float] = None) -> dict:
+    """Apply retention and the disk budget once and report what was reclaimed.
+
+    Projects with a running job are left untouched.
+    """
+    now = time.time() if now is None else now
+    with _sweep_lock, metrics.stage_timer("storage_sweep"):
+        report: dict = {"expired": {}, "evicted": {}}
+        report["migrated_projects"] = migrate_legacy_layout()
+
+        # Files are expired and evicted in units: a preview package goes as a whole
+        units: Dict[str, list] = {}
+        total = 0
+        reclaimed = 0
+        for artifact in _iter_artifacts():
+            total += artifact.size
+            if process_runner.is_active(artifact.project_id):
+                continue
+            key = _package_root(artifact.path) if artifact.kind == "preview" else artifact.path
+            units.setdefault(key, []).append(artifact)
+
+        remaining = []
+        for unit in units.values():
+            days = RETENTION_DAYS.get(unit[0].kind, 0)
+            newest = max(artifact.mtime for artifact in unit)
+            if days > 0 and now - newest > days * 86400:
+                reclaimed += _delete_unit(unit, "expired", report)
+            elif unit[0].kind in REGENERABLE:
+                remaining.append(unit)
+        total -= reclaimed
+
+        if DISK_BUDGET_BYTES > 0 and total > DISK_BUDGET_BYTES:
+            target = DISK_BUDGET_BYTES * DISK_LOW_WATERMARK
+            for unit in sorted(remaining, key=lambda u: max(a.last_used for a in u)):
+                if total <= target:
+                    break
+                freed = _delete_unit(unit, "evicted", report)
+                total -= freed
+                reclaimed += freed
+            if total > DISK_BUDGET_BYTES:
+                logger.warning(
+                    "DATA_DIR still over budget after eviction: %d of %d bytes used", total, DISK_BUDGET_BYTES
+                )
+
+        _remove_empty_dirs(UPLOADS_DIR, now)
+        _remove_empty_dirs(CLIPS_DIR, now)
+
+        report["reclaimed_bytes"] = reclaimed
+        report["usage_bytes"] = total
+        report["budget_bytes"] = DISK_BUDGET_BYTES
+        if reclaimed or report["migrated_projects"]:
+            logger.info(
+                "Storage sweep reclaimed %d bytes (expired=%s evicted=%s, migrated %d projects)",
+                reclaimed, report["expired"], report["evicted"], report["migrated_projects"],
+            )
+        return report
+
+
+_stop_event = threading.Event()
+_sweeper_thread: Optional[threading.Thread] = None
+
+
+def _sweeper_loop() -> None:
+    while not _stop_event.is_set():
+        try:
+            sweep()
+        except Exception:
+            logger.exception("Storage sweep failed")
+        _stop_event.wait(SWEEP_INTERVAL)
+
+
+def start_sweeper() -> None:
+    """Start the background sweeper thread (no-op if STORAGE_SWEEP_INTERVAL <= 0)."""
+    global _sweeper_thread
+    if SWEEP_INTERVAL <= 0 or (_sweeper_thread is not None and _sweeper_thread.is_alive()):
+        return
+    _stop_event.clear()
+    _sweeper_thread = threading.Thread(target=_sweeper_loop, name="storage-sweeper", daemon=True)
+    _sweeper_thread.start()
+
+
+def stop_sweeper() -> None:
+    _stop_event.set()
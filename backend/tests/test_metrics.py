@@ -0,0 +1,74 @@
+import io
+import logging
+
+from fastapi.testclient import TestClient
+
+import main
+import metrics
+
+
+def test_disk_usage_is_cached_between_scrapes(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "_data_dirs", {"clips": str(tmp_path)})
+    monkeypatch.setattr(metrics, "_disk_usage_expires", 0.0)
+    (tmp_path / "a.mp4").write_bytes(b"x" * 10)
+    key = metrics._label_key({"area": "clips"})
+    assert metrics._collect_disk_usage()[key] == 10.0
+
+    (tmp_path / "b.mp4").write_bytes(b"x" * 5)
+    assert metrics._collect_disk_usage()[key] == 10.0
+
+    monkeypatch.setattr(metrics, "_disk_usage_expires", 0.0)
+    assert metrics._collect_disk_usage()[key] == 15.0
+
+
+def test_span_line_is_emitted_when_enabled(monkeypatch):
+    monkeypatch.setattr(metrics, "SPAN_LOGGING", True)
+    metrics.configure_logging()
+    clipper_logger = logging.getLogger("clipper")
+    stream = io.StringIO()
+    monkeypatch.setattr(clipper_logger.handlers[0], "stream", stream)
+
+    with metrics.stage_timer("probe", "project-1", variant="clip-0"):
+        pass
+
+    assert "span project=project-1 stage=probe variant=clip-0 status=ok" in stream.getvalue()
+
+
+def test_histogram_renders_cumulative_buckets_sum_and_count():
+    histogram = metrics.Histogram("test_duration_seconds", "Test durations.", buckets=(0.5, 1.0))
+    histogram.observe(0.2, stage="probe")
+    histogram.observe(0.7, stage="probe")
+    histogram.observe(3.0, stage="probe")
+
+    assert histogram.render() == [
+        "# HELP test_duration_seconds Test durations.",
+        "# TYPE test_duration_seconds histogram",
+        'test_duration_seconds_bucket{stage="probe",le="0.5"} 1',
+        'test_duration_seconds_bucket{stage="probe",le="1.0"} 2',
+        'test_duration_seconds_bucket{stage="probe",le="+Inf"} 3',
+        'test_duration_seconds_sum{stage="probe"} 3.9',
+        'test_duration_seconds_count{stage="probe"} 3',
+    ]
+
+
+def test_label_values_are_escaped():
+    counter = metrics.Counter("test_total", "Test counter.")
+    counter.inc(kind='say "hi"\\now\n')
+
+    assert counter.render()[-1] == 'test_total{kind="say \\"hi\\"\\\\now\\n"} 1.0'
+
+
+def test_render_metrics_includes_registered_metrics():
+    output = metrics.render_metrics()
+
+    assert output.endswith("\n")
+    assert "# TYPE clipper_stage_duration_seconds histogram" in output
+    assert "clipper_ffmpeg_processes_running 0" in output
+
+
+def test_metrics_endpoint_serves_prometheus_text():
+    response = TestClient(main.app).get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "# TYPE clipper_data_dir_bytes gauge" in response.text
@@ -0,0 +1,60 @@
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import process_runner
+
+
+@pytest.fixture
+def single_slot(monkeypatch):
+    monkeypatch.setattr(process_runner, "_semaphore", threading.BoundedSemaphore(1))
+
+
+def _sleep_cmd(seconds):
+    return [sys.executable, "-c", f"import time; time.sleep({seconds})"]
+
+
+def test_queue_wait_does_not_count_towards_timeout(single_slot):
+    holder = threading.Thread(target=process_runner.run_process, args=(_sleep_cmd(1.5), 10))
+    holder.start()
+    time.sleep(0.3)
+    # Would time out if the 1.2 s spent queued behind the holder counted
+    result = process_runner.run_process(_sleep_cmd(0), timeout=1)
+    holder.join()
+    assert result.returncode == 0
+
+
+def test_queue_timeout_limits_waiting(single_slot, monkeypatch):
+    monkeypatch.setattr(process_runner, "QUEUE_TIMEOUT", 0.3)
+    holder = threading.Thread(target=process_runner.run_process, args=(_sleep_cmd(1.5), 10))
+    holder.start()
+    time.sleep(0.2)
+    with pytest.raises(subprocess.TimeoutExpired):
+        process_runner.run_process(_sleep_cmd(0), timeout=10)
+    holder.join()
+
+
+def test_running_process_is_killed_on_timeout():
+    start = time.monotonic()
+    with pytest.raises(subprocess.TimeoutExpired):
+        process_runner.run_process(_sleep_cmd(5), timeout=0.5)
+    assert time.monotonic() - start < 3
+
+
+def test_running_process_is_killed_on_cancel():
+    cancel = threading.Event()
+    threading.Timer(0.3, cancel.set).start()
+    with pytest.raises(process_runner.JobCancelled):
+        process_runner.run_process(_sleep_cmd(5), timeout=10, cancel=cancel)
+
+
+def test_stderr_tail_is_bounded_without_newlines(monkeypatch):
+    monkeypatch.setattr(process_runner, "STDERR_TAIL_BYTES", 1024)
+    # Mimics ffmpeg progress: many `\r`-separated updates and no newline
+    script = "import sys; [sys.stderr.write(f'frame={i}\\r') for i in range(20000)]; sys.stderr.write('END')"
+    result = process_runner.run_process([sys.executable, "-c", script], timeout=10)
+    assert len(result.stderr) <= 1024
+    assert result.stderr.endswith(b"END")
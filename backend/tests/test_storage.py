@@ -0,0 +1,110 @@
+import os
+import time
+
+import pytest
+
+import process_runner
+import storage
+
+PROJECT = "0048b828-4a59-414f-9477-ebaf41f6fd8c"
+OTHER_PROJECT = "17134bb5-1855-42a1-a740-51a0880074ad"
+DAY = 86400
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    uploads, clips = tmp_path / "uploads", tmp_path / "clips"
+    uploads.mkdir()
+    clips.mkdir()
+    monkeypatch.setattr(storage, "UPLOADS_DIR", str(uploads))
+    monkeypatch.setattr(storage, "CLIPS_DIR", str(clips))
+    monkeypatch.setattr(storage, "RETENTION_DAYS", {
+        "source": 0, "clip": 0, "captions": 0, "thumbnail": 30, "preview": 7, "other": 0,
+    })
+    monkeypatch.setattr(storage, "DISK_BUDGET_BYTES", 0)
+    return tmp_path
+
+
+def _write(path, size=100, age_days=0.0, used_days_ago=None):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+    mtime = time.time() - age_days * DAY
+    atime = mtime if used_days_ago is None else time.time() - used_days_ago * DAY
+    os.utime(path, (atime, mtime))
+    return path
+
+
+def _clip_file(project_id, name, **kwargs):
+    return _write(os.path.join(storage.project_clips_dir(project_id), name), **kwargs)
+
+
+def test_expired_derivatives_are_deleted_and_user_data_kept(data_dir):
+    old_thumb = _clip_file(PROJECT, f"{PROJECT}-clip-0.jpg", age_days=40)
+    new_thumb = _clip_file(PROJECT, f"{PROJECT}-clip-1.jpg", age_days=1)
+    old_clip = _clip_file(PROJECT, f"{PROJECT}-clip-0.mp4", age_days=400)
+    old_captions = _clip_file(PROJECT, "captions.json", age_days=400)
+    old_source = _write(os.path.join(storage.project_upload_dir(PROJECT), "source.mp4"), age_days=400)
+
+    report = storage.sweep()
+
+    assert not os.path.exists(old_thumb)
+    assert os.path.exists(new_thumb)
+    assert os.path.exists(old_clip)
+    assert os.path.exists(old_captions)
+    assert os.path.exists(old_source)
+    assert report["expired"] == {"thumbnail": {"files": 1, "bytes": 100}}
+    assert report["reclaimed_bytes"] == 100
+
+
+def test_eviction_removes_least_recently_used_first(data_dir, monkeypatch):
+    stale = _clip_file(PROJECT, f"{PROJECT}-clip-0.jpg", size=400, used_days_ago=5)
+    recent = _clip_file(PROJECT, f"{PROJECT}-clip-1.jpg", size=400, used_days_ago=1)
+    clip = _clip_file(PROJECT, f"{PROJECT}-clip-0.mp4", size=400, used_days_ago=10)
+    monkeypatch.setattr(storage, "DISK_BUDGET_BYTES", 1000)
+
+    report = storage.sweep()
+
+    # Evicting the stalest thumbnail brings 1200 bytes under 90% of the budget
+    assert not os.path.exists(stale)
+    assert os.path.exists(recent)
+    # Clips are never evicted, however old their last use
+    assert os.path.exists(clip)
+    assert report["evicted"] == {"thumbnail": {"files": 1, "bytes": 400}}
+    assert report["usage_bytes"] == 800
+
+
+def test_preview_package_is_removed_as_a_whole(data_dir, monkeypatch):
+    package = os.path.join(storage.project_clips_dir(PROJECT), "hls", f"{PROJECT}-clip-0")
+    _write(os.path.join(package, "master.m3u8"), size=10, used_days_ago=0)
+    _write(os.path.join(package, "hi", "seg_000.m4s"), size=500, used_days_ago=0)
+    # The least recently used file belongs to the package, but it goes as one unit
+    _write(os.path.join(package, "lo", "seg_000.m4s"), size=500, used_days_ago=9)
+    thumb = _clip_file(PROJECT, f"{PROJECT}-clip-0.jpg", size=100, used_days_ago=3)
+    monkeypatch.setattr(storage, "DISK_BUDGET_BYTES", 1000)
+
+    report = storage.sweep()
+
+    assert not os.path.exists(package)
+    assert os.path.exists(thumb)
+    assert report["evicted"] == {"preview": {"files": 3, "bytes": 1010}}
+
+
+def test_active_projects_are_skipped(data_dir, monkeypatch):
+    active_thumb = _clip_file(PROJECT, f"{PROJECT}-clip-0.jpg", age_days=40)
+    idle_thumb = _clip_file(OTHER_PROJECT, f"{OTHER_PROJECT}-clip-0.jpg", age_days=40)
+    event = process_runner.register_job(PROJECT)
+    try:
+        storage.sweep()
+    finally:
+        process_runner.unregister_job(PROJECT, event)
+
+    assert os.path.exists(active_thumb)
+    assert not os.path.exists(idle_thumb)
+
+
+def test_project_dirs_reject_non_uuid_ids(data_dir):
+    with pytest.raises(storage.InvalidProjectId):
+        storage.project_clips_dir("..")
+    with pytest.raises(storage.InvalidProjectId):
+        storage.project_upload_dir("../clips")
@@ -0,0 +1,253 @@
+import os
+import subprocess
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import process_runner
+import storage
+from routers import videos
+
+PROJECT = "0048b828-4a59-414f-9477-ebaf41f6fd8c"
+
+
+@pytest.fixture
+def client():
+    return TestClient(main.app)
+
+
+@pytest.fixture
+def clips_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "CLIPS_DIR", str(tmp_path))
+    monkeypatch.setattr(videos, "get_ffmpeg_path", lambda: "ffmpeg")
+    return tmp_path
+
+
+def _project_clip(name="clip-0"):
+    project_dir = storage.project_clips_dir(PROJECT)
+    os.makedirs(project_dir, exist_ok=True)
+    path = os.path.join(project_dir, f"{PROJECT}-{name}.mp4")
+    with open(path, "wb") as f:
+        f.write(b"mp4")
+    return project_dir
+
+
+@pytest.mark.parametrize("url", [
+    "/api/clips/%2e%2e/main.py",
+    "/api/clips/%2e%2e/requirements.txt",
+    "/api/thumbnails/%2e%2e/main.py",
+    "/api/hls/%2e%2e/x/master.m3u8",
+    "/api/projects/%2e%2e/clips",
+])
+def test_non_uuid_project_ids_are_not_found(client, url):
+    assert client.get(url).status_code == 404
+
+
+@pytest.mark.parametrize("url", [
+    "/api/mobile-clips/%2e%2e",
+    "/api/captions/%2e%2e",
+    "/api/ai-thumbnails/%2e%2e",
+    "/api/hls/%2e%2e",
+])
+def test_non_uuid_project_ids_are_rejected_by_processing_routes(client, url):
+    assert client.post(url).status_code == 404
+
+
+def test_overlapping_trims_of_the_same_clip_are_rejected(client, monkeypatch):
+    clip_id = f"{PROJECT}-clip-0"
+    monkeypatch.setattr(videos.storage, "find_source_video", lambda project_id: "source.mp4")
+    monkeypatch.setattr(videos, "_trims_in_progress", {(PROJECT, clip_id)})
+
+    response = client.post(f"/api/clips/{PROJECT}/{clip_id}/trim", data={"start": "1", "end": "5"})
+
+    assert response.status_code == 409
+
+
+@pytest.mark.parametrize("start, end", [("nan", "5"), ("1", "inf"), ("-1", "5"), ("5", "5")])
+def test_invalid_trim_boundaries_are_rejected(client, start, end):
+    response = client.post(f"/api/clips/{PROJECT}/{PROJECT}-clip-0/trim", data={"start": start, "end": end})
+
+    assert response.status_code == 400
+
+
+def test_trimmed_durations_roll_over_into_minutes():
+    assert videos._format_duration(42.9) == "0:42"
+    assert videos._format_duration(75) == "1:15"
+
+
+def test_thumbnail_is_not_found_when_ffmpeg_writes_no_frame(client, clips_dir, monkeypatch):
+    _project_clip()
+    # Seeking past the end of a short clip exits 0 without writing anything
+    monkeypatch.setattr(videos, "_run", lambda cmd, *args, **kwargs: subprocess.CompletedProcess(cmd, 0))
+
+    response = client.get(f"/api/thumbnails/{PROJECT}/{PROJECT}-clip-0-ai-2.jpg")
+
+    assert response.status_code == 404
+
+
+def test_missing_thumbnail_is_regenerated_from_its_clip(client, clips_dir, monkeypatch):
+    _project_clip()
+
+    def fake_run(cmd, *args, **kwargs):
+        with open(cmd[-1], "wb") as f:
+            f.write(b"jpeg")
+        return subprocess.CompletedProcess(cmd, 0)
+
+    monkeypatch.setattr(videos, "_run", fake_run)
+
+    response = client.get(f"/api/thumbnails/{PROJECT}/{PROJECT}-clip-0.jpg")
+
+    assert response.status_code == 200
+    assert response.content == b"jpeg"
+    assert sorted(os.listdir(storage.project_clips_dir(PROJECT))) == [f"{PROJECT}-clip-0.jpg", f"{PROJECT}-clip-0.mp4"]
+
+
+def _hls_package(clip_id=f"{PROJECT}-clip-0"):
+    hls_dir = os.path.join(_project_clip(), "hls", clip_id)
+    os.makedirs(os.path.join(hls_dir, "v-1", "lo"))
+    files = {
+        "master.m3u8": b"#EXTM3U\n",
+        "v-1/lo/index.m3u8": b"#EXTM3U\n",
+        "v-1/lo/init.mp4": b"init",
+        "v-1/lo/seg_000.m4s": b"seg",
+        "v-1/lo/notes.txt": b"x",
+    }
+    for name, content in files.items():
+        with open(os.path.join(hls_dir, name), "wb") as f:
+            f.write(content)
+    return clip_id
+
+
+@pytest.mark.parametrize("hls_file, media_type", [
+    ("master.m3u8", "application/vnd.apple.mpegurl"),
+    ("v-1/lo/init.mp4", "video/mp4"),
+    ("v-1/lo/seg_000.m4s", "video/iso.segment"),
+])
+def test_hls_files_are_served_with_their_media_type(client, clips_dir, hls_file, media_type):
+    clip_id = _hls_package()
+
+    response = client.get(f"/api/hls/{PROJECT}/{clip_id}/{hls_file}")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith(media_type)
+
+
+@pytest.mark.parametrize("hls_file", [
+    "v-1/lo/notes.txt",
+    "%2e%2e/%2e%2e/" + f"{PROJECT}-clip-0.mp4",
+    "..%2f..%2f" + f"{PROJECT}-clip-0.mp4",
+    "v-1/missing.m4s",
+])
+def test_hls_route_only_serves_playlists_and_segments_of_the_package(client, clips_dir, hls_file):
+    clip_id = _hls_package()
+
+    response = client.get(f"/api/hls/{PROJECT}/{clip_id}/{hls_file}")
+
+    assert response.status_code == 404
+
+
+def test_master_playlist_lists_variants_lightest_first():
+    playlist = videos._master_playlist([
+        ("v-1/lo/index.m3u8", 360000, 180, 320),
+        ("v-1/hi/index.m3u8", 1200000, 360, 640),
+    ])
+
+    assert playlist.splitlines() == [
+        "#EXTM3U",
+        "#EXT-X-VERSION:7",
+        "#EXT-X-INDEPENDENT-SEGMENTS",
+        "#EXT-X-STREAM-INF:BANDWIDTH=360000,RESOLUTION=180x320",
+        "v-1/lo/index.m3u8",
+        "#EXT-X-STREAM-INF:BANDWIDTH=1200000,RESOLUTION=360x640",
+        "v-1/hi/index.m3u8",
+    ]
+
+
+def test_packaging_skips_a_clip_already_being_packaged(clips_dir, monkeypatch):
+    clip_path = os.path.join(_project_clip(), f"{PROJECT}-clip-0.mp4")
+    monkeypatch.setattr(videos, "_packaging_in_progress", {(PROJECT, f"{PROJECT}-clip-0")})
+    monkeypatch.setattr(videos, "_run", lambda *args, **kwargs: pytest.fail("ffmpeg should not run"))
+
+    assert videos._package_hls(PROJECT, clip_path) is None
+
+
+def _cancelled(*args, **kwargs):
+    raise process_runner.JobCancelled("Job cancelled")
+
+
+def test_cancelled_mobile_clips_return_409(client, clips_dir, monkeypatch):
+    monkeypatch.setattr(videos.storage, "find_source_video", lambda project_id: "source.mp4")
+    monkeypatch.setattr(videos, "_generate_mobile_clips", _cancelled)
+
+    assert client.post(f"/api/mobile-clips/{PROJECT}").status_code == 409
+
+
+def test_cancelled_ai_thumbnails_return_409(client, clips_dir, monkeypatch):
+    _project_clip()
+    monkeypatch.setattr(videos, "_generate_ai_thumbnails", _cancelled)
+
+    assert client.post(f"/api/ai-thumbnails/{PROJECT}").status_code == 409
+
+
+def test_cancel_during_mobile_thumbnail_is_not_swallowed(clips_dir, monkeypatch):
+    def fake_run(cmd, tool, stage, *args, **kwargs):
+        if stage == "thumbnail":
+            _cancelled()
+        return subprocess.CompletedProcess(cmd, 0, stdout="20.0")
+
+    monkeypatch.setattr(videos, "_run", fake_run)
+
+    with pytest.raises(process_runner.JobCancelled):
+        videos._generate_mobile_clips(PROJECT, "source.mp4")
+    assert not os.path.exists(os.path.join(storage.project_clips_dir(PROJECT), videos.CLIP_MANIFEST))
+
+
+EVERY_2S = [float(t) for t in range(0, 16, 2)]
+
+
+@pytest.mark.parametrize("old, keyframes, new, expected", [
+    # Extend past the old end: the whole old render is copied, only the tail is encoded
+    ((10, 25), EVERY_2S, (10, 30), (10, 25)),
+    # Trim both edges: copy from the first keyframe inside to the last one
+    ((0, 15), EVERY_2S, (3, 12), (4, 12)),
+    # Shrink inside one GOP of an old render with ~10 s keyframes
+    ((0, 15), [0.0, 10.0], (3, 8), None),
+    # No overlap with the old range
+    ((0, 15), EVERY_2S, (20, 30), None),
+    # Copy span (4 to 5) shorter than HLS_SEGMENT_SECONDS
+    ((0, 15), [float(t) for t in range(15)], (3.5, 5.5), None),
+])
+def test_copy_span_selection(old, keyframes, new, expected):
+    assert videos._copy_span(old[0], old[1], keyframes, new[0], new[1]) == expected
+
+
+def test_trim_removes_thumbnails_past_the_new_end(clips_dir, monkeypatch):
+    clip_id = f"{PROJECT}-clip-0"
+    project_dir = _project_clip()
+    videos._update_clip_records(project_dir, {clip_id: {"id": clip_id, "start": 0, "end": 15, "vf": "null"}})
+    thumbnails = [f"{clip_id}.jpg"] + [f"{clip_id}-ai-{i}.jpg" for i in range(3)]
+    for name in thumbnails:
+        with open(os.path.join(project_dir, name), "wb") as f:
+            f.write(b"old")
+
+    def fake_run(cmd, tool, stage, *args, **kwargs):
+        if stage == "thumbnail":
+            seek = cmd[cmd.index("-ss") + 1]
+            # ffmpeg writes no frame when seeking past the end of the 2 s clip
+            if int(seek.rsplit(":", 1)[-1]) >= 2:
+                return subprocess.CompletedProcess(cmd, 0)
+        with open(cmd[-1], "wb") as f:
+            f.write(b"new")
+        return subprocess.CompletedProcess(cmd, 0)
+
+    monkeypatch.setattr(videos, "_run", fake_run)
+    monkeypatch.setattr(videos, "_source_duration", lambda *args: 60.0)
+    monkeypatch.setattr(videos, "_keyframe_times", lambda *args: [0.0, 10.0])
+
+    videos._rerender_clip(PROJECT, clip_id, "source.mp4", 0, 2)
+
+    remaining = {name for name in thumbnails if os.path.isfile(os.path.join(project_dir, name))}
+    assert remaining == {f"{clip_id}.jpg", f"{clip_id}-ai-0.jpg"}
+    with open(os.path.join(project_dir, f"{clip_id}-ai-0.jpg"), "rb") as f:
+        assert f.read() == b"new"
@@ -70,6 +70,17 @@ export const api = {
     return res.json();
   },
   
+  async packageHlsPreviews(projectId: string) {
+    const res = await fetch(`${API_BASE_URL}/api/hls/${projectId}`, {
+      method: "POST",
+    });
+    if (!res.ok) {
+      const errorText = await res.text();
+      throw new Error(`Preview packaging failed: ${res.status} - ${errorText}`);
+    }
+    return res.json();
+  },
+  
   async generateAIThumbnails(projectId: string) {
     const res = await fetch(`${API_BASE_URL}/api/ai-thumbnails/${projectId}`, {
       method: "POST",
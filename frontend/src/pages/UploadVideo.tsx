@@ -23,6 +23,11 @@ const LANGUAGES = [
   { code: "hi", name: "Hindi" },
 ];
 
+// Browsers with native HLS (Safari, iOS, Android) get the adaptive preview; others stream the MP4
+const SUPPORTS_NATIVE_HLS =
+  typeof document !== "undefined" &&
+  document.createElement("video").canPlayType("application/vnd.apple.mpegurl") !== "";
+
 const UploadVideo = () => {
   const [uploadProgress, setUploadProgress] = useState(0);
   const [isProcessing, setIsProcessing] = useState(false);
@@ -139,6 +144,7 @@ const UploadVideo = () => {
       setIsProcessing(false);
       setProjectId(res.project_id);
       setClips(res.clips || []);
+      void requestHlsPreviews(res.project_id);
       
       // Get actual video duration
       const duration = await getVideoDuration(file);
@@ -227,6 +233,7 @@ const UploadVideo = () => {
       setUploadProgress(100);
       setProjectId(res.project_id);
       setClips(res.clips || []);
+      void requestHlsPreviews(res.project_id);
       setUploadedVideoInfo({
         name: "Imported Video",
         size: "Unknown",
@@ -265,6 +272,28 @@ const UploadVideo = () => {
     setShowPreview(!showPreview);
   };
 
+  const clipDownloadUrl = (clip: any) => `${API_BASE_URL}/api/clips/${projectId}/${clip.path}`;
+
+  const clipPreviewUrl = (clip: any) =>
+    clip.hls && SUPPORTS_NATIVE_HLS ? `${API_BASE_URL}${clip.hls}` : clipDownloadUrl(clip);
+
+  // Package adaptive previews in the background; clips play the MP4 until they are ready
+  const requestHlsPreviews = async (id: string) => {
+    if (!SUPPORTS_NATIVE_HLS) return;
+    try {
+      const result = await api.packageHlsPreviews(id);
+      const urls = new Map<string, string>(
+        result.previews.filter((p: any) => p.hls).map((p: any) => [p.clip_id, p.hls])
+      );
+      const withHls = (list: any[]) =>
+        list.map((clip) => (urls.has(clip.id) ? { ...clip, hls: urls.get(clip.id) } : clip));
+      setClips(withHls);
+      setMobileClips(withHls);
+    } catch (e) {
+      console.warn("HLS preview packaging failed:", e);
+    }
+  };
+
   const handleClipPreview = (clipId: string) => {
     setPreviewingClip(previewingClip === clipId ? null : clipId);
   };
@@ -276,6 +305,7 @@ const UploadVideo = () => {
     try {
       const result = await api.generateMobileClips(projectId);
       setMobileClips(result.clips);
+      void requestHlsPreviews(projectId);
       toast({
         title: "Mobile Clips Generated",
         description: `Generated ${result.clips.length} mobile-optimized clips`,
@@ -748,10 +778,15 @@ const UploadVideo = () => {
                         <div className="p-3 border-t">
                           <div className="aspect-video bg-muted rounded-lg overflow-hidden">
                             <video
-                              src={`${API_BASE_URL}/api/clips/${projectId}/${clip.path}`}
+                              src={clipPreviewUrl(clip)}
                               controls
                               className="w-full h-full object-contain"
                               onError={(e) => {
+                                // Fall back to the MP4 if the HLS preview is missing (e.g. evicted)
+                                if (e.currentTarget.src !== clipDownloadUrl(clip)) {
+                                  e.currentTarget.src = clipDownloadUrl(clip);
+                                  return;
+                                }
                                 console.error('Video load error:', e);
                                 toast({ title: "Preview Error", description: "Could not load video preview", variant: "destructive" });
                               }}
@@ -838,10 +873,15 @@ const UploadVideo = () => {
                         <div className="p-3 border-t">
                           <div className="aspect-[9/16] bg-muted rounded-lg overflow-hidden">
                             <video
-                              src={`${API_BASE_URL}/api/clips/${projectId}/${clip.path}`}
+                              src={clipPreviewUrl(clip)}
                               controls
                               className="w-full h-full object-contain"
                               onError={(e) => {
+                                // Fall back to the MP4 if the HLS preview is missing (e.g. evicted)
+                                if (e.currentTarget.src !== clipDownloadUrl(clip)) {
+                                  e.currentTarget.src = clipDownloadUrl(clip);
+                                  return;
+                                }
                                 console.error('Video load error:', e);
                                 toast({ title: "Preview Error", description: "Could not load video preview", variant: "destructive" });
                               }}